@@ -1,52 +1,52 @@
-from devices.device import device_lock
+from devices.worker import get_worker, SAFETY, CONTROL
 from core.cooldown_loop_dilution_v2 import switch_on, switch_off, heater_on, heater_off
 
 class DeviceController:
     def __init__(self, devices):
         """
         devices: dict[str, device]
+
+        Every action runs on the I/O worker of its device, so it only waits
+        for commands already queued on that instrument. Switching things off
+        is queued as SAFETY and jumps ahead of queued temperature polls.
         """
         self.devices = devices
 
     # ---------------- Switch Functions ----------------
     def set_switch_voltage(self, device_name, channel, voltage):
         device = self.devices[device_name]
-        with device_lock:
-            switch_on(device, channel, voltage)
+        get_worker(device).call(switch_on, device, channel, voltage, priority=CONTROL)
 
     def turn_off_switch(self, device_name, channel):
         device = self.devices[device_name]
-        with device_lock:
-            switch_off(device, channel)
+        get_worker(device).call(switch_off, device, channel, priority=SAFETY)
 
     # ---------------- Heater Functions ----------------
     def set_heater_temperature(self, device_name, channel, temperature):
         device = self.devices[device_name]
-        with device_lock:
+
+        def action():
             device.write_setpoint(channel, temperature)
             heater_on(device, channel)
+        get_worker(device).call(action, priority=CONTROL)
 
     def turn_off_heater(self, device_name, channel):
         device = self.devices[device_name]
-        with device_lock:
-            heater_off(device, channel)
+        get_worker(device).call(heater_off, device, channel, priority=SAFETY)
 
     def toggle_heater(self, device_name, channel, state):
         device = self.devices[device_name]
-        with device_lock:
-            if state:
-                heater_on(device, channel)
-            else:
-                heater_off(device, channel)
+        if state:
+            get_worker(device).call(heater_on, device, channel, priority=CONTROL)
+        else:
+            get_worker(device).call(heater_off, device, channel, priority=SAFETY)
 
     # ---------------- Still Heater Functions ----------------
     def set_still_percentage(self, device_name, channel, percent):
         device = self.devices[device_name]
-        with device_lock:
-            device.set_still_voltage(percent)
+        get_worker(device).call(device.set_still_voltage, percent, priority=CONTROL)
 
     def turn_off_still(self, device_name, channel):
         device = self.devices[device_name]
-        with device_lock:
-            device.set_still_voltage(0)
+        get_worker(device).call(device.set_still_voltage, 0, priority=SAFETY)
 
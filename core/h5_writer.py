@@ -0,0 +1,223 @@
+import queue
+import threading
+import time
+import numpy as np
+import h5py
+
+# Rows per HDF5 chunk; 1024 float64 values = 8 KiB per chunk and dataset
+CHUNK_ROWS = 1024
+# Buffered rows are written once either limit is reached
+FLUSH_ROWS = 256
+FLUSH_INTERVAL = 10.0   # seconds
+# Rows waiting for the writer thread before append() blocks
+MAX_QUEUE = 10000
+# Seconds append() waits for room in a full queue before dropping the row
+APPEND_TIMEOUT = 5.0
+
+
+def _to_float(value):
+    # readings that are missing or not numeric are stored as NaN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class HDF5Writer(threading.Thread):
+    """
+    Append-only HDF5 logger running on its own thread.
+
+    Data is organised in tables: a table is an HDF5 group (or the file root)
+    whose 1-D float64 datasets all have one entry per row. Producers call
+    append(table, row) with a {dataset: value} dictionary, which only puts
+    the row on a queue. The writer thread keeps the file open, collects the
+    rows in memory and appends them to the datasets in blocks, flushing the
+    file after each block.
+
+    Datasets missing from a row are written as NaN, so every dataset of a
+    table stays aligned with the others. A dataset first seen after some
+    rows were written is created and padded with NaN. A block that fails
+    before any data is written is retried (at most max_queue rows are kept);
+    one that fails while writing is dropped, leaving NaN, never duplicates.
+
+    If the file cannot be opened, or the writer thread fails otherwise, the
+    exception is kept in `error` and later rows are dropped and counted in
+    `rows_dropped`; append() and close() never block on a dead writer.
+    """
+
+    def __init__(self, filename, mode="a", layout=None, chunk_rows=CHUNK_ROWS,
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE,
+                 append_timeout=APPEND_TIMEOUT):
+        """
+        :param filename: HDF5 file to write; it stays open until close().
+        :param mode: h5py file mode ('a' appends to existing datasets, 'w' truncates).
+        :param layout: Dictionary {table: iterable of dataset names} to create up front.
+        :param chunk_rows: Chunk length of newly created datasets.
+        :param flush_rows: Buffered rows that trigger a write.
+        :param flush_interval: Seconds after which buffered rows are written anyway.
+        :param max_queue: Queued rows before append() waits for the writer.
+        :param append_timeout: Seconds append() waits on a full queue before dropping the row.
+        """
+        super().__init__(daemon=True, name="hdf5-writer")
+        self.filename = filename
+        self.mode = mode
+        self.layout = layout or {}
+        self.chunk_rows = chunk_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.append_timeout = append_timeout
+        self._queue = queue.Queue(max_queue)
+        self._closing = threading.Event()
+        self._rows = {}         # table -> list of buffered row dictionaries
+        self._buffered = 0
+        self._file = None
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.error = None
+
+    @property
+    def failed(self):
+        """True once the writer thread has stopped on an error or exited."""
+        return self.error is not None or (self.ident is not None and not self.is_alive())
+
+    def append(self, table, row):
+        """
+        Queue one row for writing.
+
+        :param table: Group path of the table ("/" for the file root).
+        :param row: Dictionary {dataset name: value}; values must convert to float.
+        :return: False if the row was dropped (writer failed, or queue full
+                 for longer than append_timeout).
+        """
+        if not self.failed:
+            try:
+                self._queue.put((table, row), timeout=self.append_timeout)
+                return True
+            except queue.Full:
+                pass
+        self.rows_dropped += 1
+        if self.rows_dropped == 1:
+            print(f"[HDF5Writer] Dropping rows for {self.filename}: "
+                  f"{self.error or 'writer not keeping up'}")
+        return False
+
+    def close(self, timeout=None):
+        """
+        Write everything still queued or buffered, then close the file.
+        """
+        self._closing.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # the writer stops by itself once it has drained the queue
+            pass
+        if self.is_alive():
+            self.join(timeout)
+        if self.rows_dropped:
+            print(f"[HDF5Writer] {self.rows_dropped} rows of {self.filename} were dropped")
+
+    # ---------------- writer thread ----------------
+    def _group(self, table):
+        return self._file if table in ("/", "") else self._file.require_group(table)
+
+    def _dataset(self, group, name, length):
+        if name in group:
+            return group[name]
+        # new datasets start at the table's current length, padded with NaN
+        ds = group.create_dataset(name, shape=(length,), maxshape=(None,), dtype="f8",
+                                  chunks=(self.chunk_rows,), fillvalue=np.nan)
+        return ds
+
+    def _table_length(self, group, names):
+        lengths = [group[name].shape[0] for name in names if name in group]
+        return max(lengths, default=0)
+
+    def _write_table(self, table, rows):
+        group = self._group(table)
+        names = set(self.layout.get(table, ()))
+        names.update(name for name, item in group.items() if isinstance(item, h5py.Dataset))
+        for row in rows:
+            names.update(row)
+        start = self._table_length(group, names)
+
+        # Every dataset is created and resized before any data goes in. A
+        # failure here leaves at most NaN padding, which the next attempt
+        # aligns to, so the rows can be retried.
+        datasets = {}
+        for name in names:
+            ds = self._dataset(group, name, start)
+            # datasets that fell behind (e.g. appended elsewhere) are padded first
+            length = ds.shape[0]
+            ds.resize((start + len(rows),))
+            if length < start:
+                ds[length:start] = np.nan
+            datasets[name] = ds
+
+        # From here on some datasets may hold the rows, so they are never
+        # written again, even if this fails: the rest read NaN
+        try:
+            for name, ds in datasets.items():
+                ds[start:] = np.array([_to_float(row.get(name)) for row in rows], dtype="f8")
+            self.rows_written += len(rows)
+        finally:
+            rows.clear()
+
+    def _write(self):
+        try:
+            for table, rows in self._rows.items():
+                if rows:
+                    self._write_table(table, rows)
+            self._file.flush()
+        finally:
+            # rows kept for a retry are capped like the queue, oldest dropped
+            limit = self._queue.maxsize
+            for table, rows in self._rows.items():
+                if limit and len(rows) > limit:
+                    print(f"[HDF5Writer] Dropping {len(rows) - limit} unwritten rows of {table}")
+                    del rows[:len(rows) - limit]
+            self._buffered = sum(len(rows) for rows in self._rows.values())
+
+    def _fail(self, e):
+        self.error = e
+        print(f"[HDF5Writer] ERROR, writer for {self.filename} stopped: {e}")
+
+    def run(self):
+        try:
+            self._file = h5py.File(self.filename, self.mode)
+        except Exception as e:
+            self._fail(e)
+            return
+        try:
+            for table, names in self.layout.items():
+                group = self._group(table)
+                start = self._table_length(group, names)
+                for name in names:
+                    self._dataset(group, name, start)
+            self._file.flush()
+
+            deadline = time.monotonic() + self.flush_interval
+            running = True
+            while running:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    running = False
+                elif item:
+                    table, row = item
+                    self._rows.setdefault(table, []).append(row)
+                    self._buffered += 1
+                if self._closing.is_set() and self._queue.empty():
+                    running = False
+                if (not running or self._buffered >= self.flush_rows
+                        or time.monotonic() >= deadline):
+                    try:
+                        self._write()
+                    except Exception as e:
+                        print(f"[HDF5Writer] ERROR writing {self.filename}: {e}")
+                    deadline = time.monotonic() + self.flush_interval
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._file.close()
@@ -4,14 +4,32 @@ import numpy as np
 import serial.tools.list_ports
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-import h5py
 
 from devices.CTC100 import CTC100Device
 from devices.lakeshore224device import LakeShore224Device
-from devices.lakeshore372device import LakeShore372Device
+from devices.lakeshore372device import LakeShore372Device, LakeShore372Scanner
+from devices.worker import get_worker, READOUT
+from core.poll_scheduler import AdaptivePollScheduler
+from core.ring_buffer import RingBufferSeries
+from core.h5_writer import HDF5Writer
 
 DEBUG = False
 
+# logical channel name -> instrument channel
+LAKESHORE224_CHANNELS = {
+    "4HePotA": "C1",
+    "3HePotA": "B",
+    "4HePotB": "C2",
+    "3HePotB": "D1",
+    "Condenser": "A",
+    "50K Plate": "D2",
+    "4K Plate": "D3"
+}
+LAKESHORE372_CHANNELS = {"MC": "1", "Still": "A"}
+
+# samples kept per plot window when the whole run is shown (window_seconds=None)
+HISTORY_SAMPLES = 86400
+
 class TemperaturePlotter():
     def __init__(self, window_seconds=300, interval=2000, h5_filename=None):
         super().__init__()
@@ -27,9 +45,11 @@ class TemperaturePlotter():
         self.legends = {}
         self.anims = []
         self.running = True
+        self.scheduler = None
+        self.latest = {}  # last reading of every channel
+        self.scanner372 = None
 
-        self.h5_file = None
-        self.h5_groups = {}
+        self.h5_writer = None
         self.h5_filename = h5_filename or f"temperature_log_{time.strftime('%Y%m%d_%H%M%S')}.h5"
 
     def connect_devices(self):
@@ -54,44 +74,71 @@ class TemperaturePlotter():
                      "Lakeshore224": model224, "Lakeshore372": model372}
         return {k: v for k, v in connected.items() if v is not None}
 
-    def read_temperatures(self):
+    # `channels` is the set of logical channels wanted (None for all);
+    # bulk reads return every channel of the device anyway.
+    @staticmethod
+    def read_ctc100(dev, suffix, channels=None):
+        snapshot = dev.read_snapshot()
+        return {k+suffix: snapshot.get(k) for k in ["4switch","4pump","3switch","3pump"]}
+
+    @staticmethod
+    def read_lakeshore224(dev, channels=None):
+        snapshot = dev.read_snapshot()
+        return {name: snapshot.get(ch) for name, ch in LAKESHORE224_CHANNELS.items()}
+
+    def read_lakeshore372(self, dev, channels=None):
+        # The scanner parks on the scanned channels in turn and only returns
+        # settled readings; the control input is read on every call.
+        if self.scanner372 is None:
+            sequence = [ch for ch in LAKESHORE372_CHANNELS.values() if ch != "A"]
+            self.scanner372 = LakeShore372Scanner(dev, sequence)
+        fresh = self.scanner372.step()
+        return {name: fresh[ch]["kelvin"] for name, ch in LAKESHORE372_CHANNELS.items() if ch in fresh}
+
+    def read_temperatures(self, channels=None):
         devices = self.devices
+        readers = {
+            "CTC100A": lambda dev, chs: self.read_ctc100(dev, "A", chs),
+            "CTC100B": lambda dev, chs: self.read_ctc100(dev, "B", chs),
+            "Lakeshore224": self.read_lakeshore224,
+            "Lakeshore372": self.read_lakeshore372,
+        }
+        device_channels = {
+            "CTC100A": [k+"A" for k in ["4switch","4pump","3switch","3pump"]],
+            "CTC100B": [k+"B" for k in ["4switch","4pump","3switch","3pump"]],
+            "Lakeshore224": list(LAKESHORE224_CHANNELS),
+            "Lakeshore372": list(LAKESHORE372_CHANNELS),
+        }
+        # Read all instruments in parallel, each on its own I/O worker
+        futures = {name: get_worker(devices[name]).submit(read, devices[name], channels, priority=READOUT)
+                   for name, read in readers.items()
+                   if name in devices and (channels is None or channels.intersection(device_channels[name]))}
         readings = {}
-        if "CTC100A" in devices:
-            dev = devices["CTC100A"]
-            readings["CTC100A"] = {k+"A": dev.get_temperature(k) for k in ["4switch","4pump","3switch","3pump"]}
-        if "CTC100B" in devices:
-            dev = devices["CTC100B"]
-            readings["CTC100B"] = {k+"B": dev.get_temperature(k) for k in ["4switch","4pump","3switch","3pump"]}
-        if "Lakeshore224" in devices:
-            dev = devices["Lakeshore224"]
-            readings["Lakeshore224"] = {
-                "4HePotA": dev.get_temperature("C1"),
-                "3HePotA": dev.get_temperature("B"),
-                "4HePotB": dev.get_temperature("C2"),
-                "3HePotB": dev.get_temperature("D1"),
-                "Condenser": dev.get_temperature("A"),
-                "50K Plate": dev.get_temperature("D2"),
-                "4K Plate": dev.get_temperature("D3")
-            }
-        if "Lakeshore372" in devices:
-            dev = devices["Lakeshore372"]
-            readings["Lakeshore372"] = {"MC": dev.get_temperature("1"), "Still": dev.get_temperature("A")}
+        for name, future in futures.items():
+            try:
+                readings[name] = future.result()
+            except Exception as e:
+                print(f"Error reading {name}: {e}")
         return readings
 
     def setup_h5(self, init_read):
-        self.h5_file = h5py.File(self.h5_filename, "w")
-        for dev_name, sensors in init_read.items():
-            grp = self.h5_file.create_group(dev_name)
-            self.h5_groups[dev_name] = grp
-            grp.create_dataset("time", shape=(0,), maxshape=(None,), dtype=float)
-            for ch in sensors.keys():
-                grp.create_dataset(ch, shape=(0,), maxshape=(None,), dtype=float)
+        # one group per device with a "time" dataset and one per channel;
+        # rows are buffered and written in blocks on the writer's own thread
+        layout = {dev_name: ["time"] + list(sensors) for dev_name, sensors in init_read.items()}
+        self.h5_writer = HDF5Writer(self.h5_filename, "w", layout)
+        self.h5_writer.start()
         print(f"HDF5 logging to: {self.h5_filename}")
 
-    def append_dataset(self, ds, value):
-        ds.resize((ds.shape[0]+1,))
-        ds[-1] = value
+    def log_h5(self, temps, current_time):
+        # one row per device and reading: the time once, NaN for channels not read
+        for dev_name, dev_temps in temps.items():
+            row = {"time": current_time}
+            for ch, val in dev_temps.items():
+                try:
+                    row[ch] = float(val)
+                except (TypeError, ValueError):
+                    continue
+            self.h5_writer.append(dev_name, row)
 
     def setup_plots(self):
         figs, axes, lines, data, legends = {}, {}, {}, {}, {}
@@ -105,45 +152,52 @@ class TemperaturePlotter():
             figs[win_name] = fig
             axes[win_name] = ax
             lines[win_name] = []
-            data[win_name] = {ch: [] for ch in sensors}
-            data[win_name]["times"] = []
+            data[win_name] = RingBufferSeries(sensors, self.plot_capacity())
             for ch in sensors:
                 (line,) = ax.plot([], [], lw=2, label=ch)
                 lines[win_name].append(line)
             legends[win_name] = ax.legend(loc='upper left', bbox_to_anchor=(1.02,1.0), prop={'size':11})
         self.figs, self.axes, self.lines, self.data, self.legends = figs, axes, lines, data, legends
 
+    def plot_capacity(self):
+        # enough samples for the plot window at the fastest poll rate
+        if self.window_seconds:
+            return 2 * int(np.ceil(self.window_seconds / self.scheduler.tick)) + 1
+        return HISTORY_SAMPLES
+
     def update(self, frame):
         if not self.running: return
         current_time = time.time() - self.start_time
-        temps = self.read_temperatures()
+
+        # Only read the channels the scheduler says are due; every animated
+        # figure calls update(), but each tick reads the hardware once.
+        due = self.scheduler.due()
+        if not due: return []
+        temps = self.read_temperatures(due)
+        self.scheduler.record_readings(temps, due)
+        for dev_temps in temps.values():
+            self.latest.update(dev_temps)
+        if self.h5_writer:
+            self.log_h5(temps, current_time)
 
         for win_name, sensors in self.groups.items():
-            self.data[win_name]["times"].append(current_time)
+            # channels that were not due keep their last reading
+            series = self.data[win_name]
+            fresh = {ch for dev_temps in temps.values() for ch in dev_temps}
+            series.append(current_time, {ch: self.latest.get(ch) for ch in sensors},
+                          stale=set(sensors) - fresh)
+            times, columns = series.window(self.window_seconds or None)
             for i, ch in enumerate(sensors):
-                val = None
-                for dev_temps in temps.values():
-                    if ch in dev_temps: val = dev_temps[ch]
+                val = self.latest.get(ch)
                 if val is None or (isinstance(val,float) and np.isnan(val)): continue
-                self.data[win_name][ch].append(val)
-
-                # ---------------- HDF5 Logging ----------------
-                grp_name = win_name.split()[0]  # crude mapping, adjust if needed
-                if grp_name in self.h5_groups and ch in self.h5_groups[grp_name]:
-                    self.append_dataset(self.h5_groups[grp_name][ch], val)
-                    self.append_dataset(self.h5_groups[grp_name]["time"], current_time)
-
-                times = self.data[win_name]["times"]
-                yvals = self.data[win_name][ch]
-                if self.window_seconds:
-                    start_idx = next((j for j,t in enumerate(times) if t >= current_time - self.window_seconds), 0)
-                    xdata = times[start_idx:]
-                    ydata = yvals[start_idx:]
-                else:
-                    xdata = times
-                    ydata = yvals
+
+                # samples from before the channel's first reading are NaN
+                valid = ~np.isnan(columns[ch])
+                xdata = times[valid]
+                ydata = columns[ch][valid]
                 self.lines[win_name][i].set_data(xdata, ydata)
-                grad = (ydata[-1]-ydata[0])/((xdata[-1]-xdata[0])/60) if len(ydata)>1 else 0
+                # streaming estimate kept up to date by append(), in K/min
+                grad = series.slope(ch, 60.0, 0.0)
                 self.legends[win_name].texts[i].set_text(f"{ch}\n {ydata[-1]:.3f} K\n {grad:.4f} K/min")
 
             ax = self.axes[win_name]
@@ -153,9 +207,6 @@ class TemperaturePlotter():
                 ax.set_xlim(0, current_time)
             ax.relim()
             ax.autoscale_view()
-
-        if self.h5_file:
-            self.h5_file.flush()
         return []
 
     def run(self):
@@ -164,6 +215,14 @@ class TemperaturePlotter():
             print("No devices found."); return
 
         init_read = self.read_temperatures()
+        if "Lakeshore372" in init_read:
+            # the scanner has not settled on MC yet; list every channel anyway
+            init_read["Lakeshore372"] = {name: init_read["Lakeshore372"].get(name)
+                                         for name in LAKESHORE372_CHANNELS}
+        self.scheduler = AdaptivePollScheduler(ch for sensors in init_read.values() for ch in sensors)
+        self.scheduler.record_readings(init_read)
+        for sensors in init_read.values():
+            self.latest.update(sensors)
 
         # ---------------- Grouping ----------------
         A = list(init_read.get("CTC100A", {}).keys()) + ["4HePotA","3HePotA"] if "Lakeshore224" in init_read else []
@@ -181,15 +240,17 @@ class TemperaturePlotter():
 
         self.start_time = time.time()
         for fig in self.figs.values():
-            anim = animation.FuncAnimation(fig, self.update, interval=self.interval, blit=False)
+            # tick at the fastest channel poll rate, at most every self.interval ms
+            frame_interval = min(self.interval, self.scheduler.tick * 1000)
+            anim = animation.FuncAnimation(fig, self.update, interval=frame_interval, blit=False)
             self.anims.append(anim)
 
         try:
             plt.show()
         finally:
-            if self.h5_file:
+            if self.h5_writer:
                 print("Closing HDF5 file...")
-                self.h5_file.close()
+                self.h5_writer.close()
                 print("HDF5 file closed.")
 
     def stop(self):
@@ -0,0 +1,648 @@
+"""
+Declarative cooldown recipes.
+
+A recipe is a list of stages. Each stage runs its actions once on entry and
+then waits, driven by the live acquisition values, until its minimum time
+has passed and its exit condition holds (optionally for a minimum dwell),
+or until its timeout expires. Recipes are
+written with the small Python DSL below, or loaded from YAML:
+
+    name: cryo_cool
+    repeat: false
+    safe_state: [[heater_off, He4_heater], [switch_off, He4_aio]]
+    stages:
+      - name: switches cooling
+        actions: [[switch_off, He4_aio], [switch_off, He3_aio]]
+        until: {below: [[He4_switch, He3_switch], 10]}
+        acquire: [regeneration]
+      - name: pumps heating
+        actions: [[heater_on, He4_heater], [heater_on, He3_heater]]
+        min_time: 1800
+        until: {below: [He4_head, 3.1]}
+
+If an action raises (e.g. a serial error), the stage ends as "failed", the
+recipe's safe_state actions are run and the runner stops.
+
+Stages can acquire and release named resources of a ResourcePool shared by
+the runners of several systems; RecipeScheduler uses them to run the
+systems concurrently without letting conflicting stages overlap.
+
+String arguments of actions and channel names in conditions are keys of the
+system the recipe runs on (e.g. He7_A_channels), so one recipe drives any
+7He system. compile() resolves them all up front, so a recipe that does not
+fit its system fails before the first action rather than hours into a cycle.
+"""
+import threading
+import time
+import datetime
+from abc import ABC, abstractmethod
+
+try:
+    import yaml
+except ImportError:
+    # YAML recipes are optional; the Python DSL needs nothing extra
+    yaml = None
+
+
+class RecipeError(Exception):
+    pass
+
+
+# ---------------- Shared resources ----------------
+class ResourcePool:
+    """
+    Named resources shared by the runners of several systems.
+
+    A stage can acquire resources before its actions and release them after
+    it ends, so a resource can cover a run of stages (e.g. the whole
+    regeneration of a system). Each resource has one holder at a time and
+    requests are granted in arrival order, so systems waiting for the same
+    resource take turns.
+    """
+
+    def __init__(self, names):
+        """
+        :param names: Iterable of resource names.
+        """
+        self._holders = {name: None for name in names}
+        self._waiting = []
+        self._changed = threading.Condition()
+
+    def __contains__(self, name):
+        return name in self._holders
+
+    def holders(self):
+        """
+        :return: Dictionary {resource: holder or None}.
+        """
+        with self._changed:
+            return dict(self._holders)
+
+    def waiting(self):
+        """
+        :return: Dictionary {owner: resources it is waiting for}.
+        """
+        with self._changed:
+            return {owner: names for owner, names in self._waiting}
+
+    def _grantable(self, request):
+        owner, names = request
+        if any(self._holders[n] not in (None, owner) for n in names):
+            return False
+        # nobody who asked earlier for any of these resources is still waiting
+        for earlier in self._waiting:
+            if earlier is request:
+                return True
+            if set(earlier[1]) & set(names):
+                return False
+        return True
+
+    def acquire(self, names, owner, cancel=None, queued=None):
+        """
+        Block until all the resources are free, then take them at once.
+
+        :param names: Resource names.
+        :param owner: Name of the acquiring runner.
+        :param cancel: Event that abandons the wait when set.
+        :param queued: Event set once the request holds its place in the queue.
+        :return: True if acquired, False if cancelled.
+        """
+        request = (owner, tuple(names))
+        with self._changed:
+            self._waiting.append(request)
+            if queued is not None:
+                queued.set()
+            try:
+                while not self._grantable(request):
+                    if cancel is not None and cancel.is_set():
+                        return False
+                    self._changed.wait(1.0)
+                for name in names:
+                    self._holders[name] = owner
+                return True
+            finally:
+                self._waiting.remove(request)
+                self._changed.notify_all()
+
+    def release(self, names, owner):
+        with self._changed:
+            for name in names:
+                if self._holders.get(name) == owner:
+                    self._holders[name] = None
+            self._changed.notify_all()
+
+    def release_all(self, owner):
+        self.release([name for name, holder in self.holders().items() if holder == owner], owner)
+
+
+# ---------------- Conditions ----------------
+class Condition(ABC):
+    @abstractmethod
+    def bind(self, store, resolve):
+        """
+        :param store: LiveValueStore the values are read from.
+        :param resolve: Callable mapping a recipe channel name to a store key.
+        :return: Predicate without arguments.
+        """
+
+
+class _Threshold(Condition):
+    def __init__(self, channels, threshold):
+        self.channels = [channels] if isinstance(channels, str) else list(channels)
+        self.threshold = float(threshold)
+
+    def bind(self, store, resolve):
+        keys = [resolve(ch) for ch in self.channels]
+        threshold = self.threshold
+        compare = self.compare
+
+        def predicate():
+            values = [store.latest(key) for key in keys]
+            # a channel without a valid reading never satisfies a condition
+            return all(v is not None and compare(v, threshold) for v in values)
+        return predicate
+
+    def __repr__(self):
+        return f"{type(self).__name__.lower()}({self.channels}, {self.threshold})"
+
+
+class below(_Threshold):
+    """Every channel is below the threshold."""
+    compare = staticmethod(lambda value, threshold: value < threshold)
+
+
+class above(_Threshold):
+    """Every channel is above the threshold."""
+    compare = staticmethod(lambda value, threshold: value > threshold)
+
+
+class settled(Condition):
+    """Every channel changes by less than `rate` per minute (from the live trend)."""
+
+    def __init__(self, channels, rate):
+        self.channels = [channels] if isinstance(channels, str) else list(channels)
+        self.rate = float(rate)
+
+    def bind(self, store, resolve):
+        keys = [resolve(ch) for ch in self.channels]
+        rate = self.rate
+
+        def predicate():
+            slopes = [store.slope(key, 60.0) for key in keys]
+            return all(s is not None and abs(s) < rate for s in slopes)
+        return predicate
+
+    def __repr__(self):
+        return f"settled({self.channels}, {self.rate})"
+
+
+class all_of(Condition):
+    def __init__(self, *conditions):
+        self.conditions = conditions
+
+    def bind(self, store, resolve):
+        predicates = [c.bind(store, resolve) for c in self.conditions]
+        return lambda: all(p() for p in predicates)
+
+
+class any_of(Condition):
+    def __init__(self, *conditions):
+        self.conditions = conditions
+
+    def bind(self, store, resolve):
+        predicates = [c.bind(store, resolve) for c in self.conditions]
+        return lambda: any(p() for p in predicates)
+
+
+# ---------------- Recipes ----------------
+class do:
+    """
+    An action run on stage entry: do("switch_on", "He4_aio", "switch_voltage").
+    Strings are looked up in the system; other arguments are passed as given.
+    """
+
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+
+    def __repr__(self):
+        return f"do({self.name!r}, {', '.join(map(repr, self.args))})"
+
+
+class Stage:
+    def __init__(self, name, actions=(), until=None, timeout=None, dwell=0.0,
+                 on_timeout="next", acquire=(), release=(), min_time=0.0):
+        """
+        :param name: Stage name, used in logs, timings and transitions.
+        :param actions: List of do(...) run once when the stage is entered.
+        :param until: Exit Condition; None ends the stage after its actions.
+        :param timeout: Seconds after entry before the stage gives up waiting
+                        (default: no limit); should exceed min_time.
+        :param dwell: Seconds the exit condition must hold without interruption.
+        :param on_timeout: "next" (continue), "abort" (end the cycle) or a stage name.
+        :param acquire: Shared resources to take before the actions run.
+        :param release: Shared resources to give back once the stage ends.
+        :param min_time: Seconds the stage lasts at least, whatever the exit
+                         condition does (e.g. a heater soak); without an exit
+                         condition the stage just waits this long.
+        """
+        self.name = name
+        self.actions = list(actions)
+        self.until = until
+        self.timeout = timeout
+        self.dwell = dwell
+        self.on_timeout = on_timeout
+        self.acquire = tuple(acquire)
+        self.release = tuple(release)
+        self.min_time = min_time
+
+
+class Recipe:
+    def __init__(self, name, stages, repeat=False, safe_state=()):
+        """
+        :param name: Recipe name.
+        :param stages: List of Stage, run in order.
+        :param repeat: Start over after the last stage until the runner is stopped.
+        :param safe_state: List of do(...) that leave the system safe (heaters
+                           and switches off); run when an action fails.
+        """
+        self.name = name
+        self.stages = list(stages)
+        self.repeat = repeat
+        self.safe_state = list(safe_state)
+        names = [stage.name for stage in self.stages]
+        if len(set(names)) != len(names):
+            raise RecipeError(f"Recipe {name}: stage names must be unique")
+
+    def compile(self, system, store, actions, resolve):
+        """
+        Turn the recipe into a state machine for one system.
+
+        :param system: Dictionary of the system's channels and parameters.
+        :param store: LiveValueStore the exit conditions are evaluated on.
+        :param actions: Dictionary {action name: callable(system, *args)}.
+        :param resolve: Callable(system, channel name) returning the store key.
+        :return: List of State, entered at index 0.
+        """
+        index = {stage.name: i for i, stage in enumerate(self.stages)}
+
+        def target(i, transition):
+            if transition == "next":
+                return i + 1 if i + 1 < len(self.stages) else None
+            if transition == "abort":
+                return None
+            if transition not in index:
+                raise RecipeError(f"Recipe {self.name}: unknown stage {transition!r}")
+            return index[transition]
+
+        def channel(name):
+            if name not in system:
+                raise RecipeError(f"Recipe {self.name}: system has no channel {name!r}")
+            return resolve(system, name)
+
+        states = []
+        for i, stage in enumerate(self.stages):
+            bound = self.bind_actions(stage.actions, system, actions)
+            predicate = stage.until.bind(store, channel) if stage.until is not None else None
+            states.append(State(stage, bound, predicate,
+                                {"done": target(i, "next"), "timeout": target(i, stage.on_timeout)}))
+        return states
+
+    def bind_actions(self, recipe_actions, system, actions):
+        """
+        Resolve a list of do(...) for one system.
+
+        :return: List of (do, callable, arguments).
+        """
+        def argument(value):
+            if isinstance(value, str):
+                if value not in system:
+                    raise RecipeError(f"Recipe {self.name}: system has no {value!r}")
+                return system[value]
+            return value
+
+        bound = []
+        for action in recipe_actions:
+            if action.name not in actions:
+                raise RecipeError(f"Recipe {self.name}: unknown action {action.name!r}")
+            args = tuple(argument(a) for a in action.args)
+            for name, value in zip(action.args, args):
+                if value is None:
+                    raise RecipeError(f"Recipe {self.name}: {name!r} is not set for {action}")
+            bound.append((action, actions[action.name], args))
+        return bound
+
+
+class State:
+    def __init__(self, stage, actions, predicate, transitions):
+        self.stage = stage
+        self.actions = actions
+        self.predicate = predicate
+        self.transitions = transitions
+
+
+def load_recipe(path):
+    """
+    Load a recipe from a YAML file (see the module docstring for the format).
+    """
+    if yaml is None:
+        raise RecipeError("Loading YAML recipes needs the pyyaml package")
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+    return recipe_from_dict(spec)
+
+
+def _condition_from_dict(spec):
+    (kind, value), = spec.items()
+    if kind == "below":
+        return below(*value)
+    if kind == "above":
+        return above(*value)
+    if kind == "settled":
+        return settled(*value)
+    if kind == "all":
+        return all_of(*(_condition_from_dict(c) for c in value))
+    if kind == "any":
+        return any_of(*(_condition_from_dict(c) for c in value))
+    raise RecipeError(f"Unknown condition {kind!r}")
+
+
+def recipe_from_dict(spec):
+    stages = []
+    for s in spec["stages"]:
+        stages.append(Stage(
+            s["name"],
+            actions=[do(*a) for a in s.get("actions", [])],
+            until=_condition_from_dict(s["until"]) if s.get("until") else None,
+            timeout=s.get("timeout"),
+            dwell=s.get("dwell", 0.0),
+            on_timeout=s.get("on_timeout", "next"),
+            acquire=s.get("acquire", ()),
+            release=s.get("release", ()),
+            min_time=s.get("min_time", 0.0),
+        ))
+    return Recipe(spec["name"], stages, repeat=spec.get("repeat", False),
+                  safe_state=[do(*a) for a in spec.get("safe_state", [])])
+
+
+# ---------------- Runner ----------------
+class RecipeRunner(threading.Thread):
+    """
+    Runs a compiled recipe on one system.
+
+    Several runners can run at once, one per system; device actions are
+    serialised by the shared serial lock. Every stage is timed: `timings`
+    holds one record per stage run and stage_summary() aggregates them.
+
+    An exception from a stage's actions ends that stage as "failed"; the
+    recipe's safe state is then applied and the runner stops, keeping the
+    exception in `error`.
+    """
+
+    def __init__(self, recipe, system, store, actions, resolve, lock=None, name=None,
+                 cycles=None, log_path=None, resources=None):
+        """
+        :param recipe: Recipe to run.
+        :param system: Dictionary of the system's channels and parameters.
+        :param store: LiveValueStore the exit conditions are evaluated on.
+        :param actions: Dictionary {action name: callable(system, *args)}.
+        :param resolve: Callable(system, channel name) returning the store key.
+        :param lock: Lock held while actions talk to the instruments.
+        :param name: Name used in logs (default: the recipe name).
+        :param cycles: Number of times to run the recipe (default: once, or
+                       forever if the recipe repeats).
+        :param log_path: CSV file stage timings are appended to.
+        :param resources: ResourcePool shared with other runners; without it
+                          the stages' acquire/release are ignored.
+        """
+        super().__init__(daemon=True, name=name or recipe.name)
+        self.recipe = recipe
+        self.system = system
+        self.store = store
+        self.lock = lock or threading.Lock()
+        self.states = recipe.compile(system, store, actions, resolve)
+        self.safe_actions = recipe.bind_actions(recipe.safe_state, system, actions)
+        self.cycles = cycles if cycles is not None else (None if recipe.repeat else 1)
+        self.log_path = log_path
+        self.resources = resources
+        if resources is not None:
+            for stage in recipe.stages:
+                for name in stage.acquire + stage.release:
+                    if name not in resources:
+                        raise RecipeError(f"Recipe {recipe.name}: unknown resource {name!r}")
+        self.timings = []
+        self.cycle = 0
+        self.current_stage = None
+        self.error = None
+        # set once the runner is in its first stage or queued for its resources
+        self.ready = threading.Event()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """
+        Stop at the next published sample; the stage in progress is not completed.
+        """
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set() and (self.cycles is None or self.cycle < self.cycles):
+                self.run_cycle()
+        except Exception as e:
+            # whatever ends the thread, the system is not left half switched
+            print(f"[{self.name}] ERROR: {e}")
+            self.error = e
+            self.apply_safe_state()
+        finally:
+            self.ready.set()
+
+    def run_cycle(self):
+        """
+        Run the state machine once from its first stage (also usable
+        synchronously, without starting the thread).
+        """
+        index = 0
+        try:
+            while index is not None and not self._stop_event.is_set():
+                state = self.states[index]
+                outcome = self.run_state(state, self.cycle)
+                if outcome == "stopped":
+                    break
+                if outcome == "failed":
+                    self.apply_safe_state()
+                    self.stop()
+                    break
+                index = state.transitions[outcome]
+        finally:
+            # an aborted or stopped cycle must not keep the other systems waiting
+            if self.resources is not None:
+                self.resources.release_all(self.name)
+        self.cycle += 1
+
+    def run_state(self, state, cycle):
+        stage = state.stage
+        waited = 0.0
+        if self.resources is not None and stage.acquire:
+            print(f"[{self.name}] {stage.name}: waiting for {', '.join(stage.acquire)}")
+            requested = time.monotonic()
+            if not self.resources.acquire(stage.acquire, self.name, self._stop_event, self.ready):
+                return "stopped"
+            waited = time.monotonic() - requested
+        self.current_stage = stage.name
+        self.ready.set()
+        started = time.monotonic()
+        start_time = datetime.datetime.now()
+        print(f"[{self.name}] {stage.name}: started at {start_time}")
+
+        outcome = "done"
+        try:
+            with self.lock:
+                for action, func, args in state.actions:
+                    func(self.system, *args)
+        except Exception as e:
+            print(f"[{self.name}] {stage.name}: {action} failed: {e}")
+            self.error = e
+            outcome = "failed"
+
+        if outcome == "failed":
+            # no waiting on a system whose actions did not all go through
+            pass
+        elif state.predicate is not None:
+            predicate = state.predicate
+            min_time = stage.min_time
+            met = self.store.wait_until(
+                lambda: self._stop_event.is_set()
+                or (time.monotonic() - started >= min_time and predicate()),
+                stage.timeout, stage.dwell)
+            if self._stop_event.is_set():
+                outcome = "stopped"
+            elif not met:
+                outcome = "timeout"
+        elif stage.min_time:
+            remaining = stage.min_time - (time.monotonic() - started)
+            if self._stop_event.wait(max(0.0, remaining)):
+                outcome = "stopped"
+
+        duration = time.monotonic() - started
+        print(f"[{self.name}] {stage.name}: {outcome} after {duration:.0f} s")
+        self.record(cycle, stage.name, start_time, duration, outcome, waited)
+        if self.resources is not None and stage.release and outcome not in ("stopped", "failed"):
+            self.resources.release(stage.release, self.name)
+        self.current_stage = None
+        return outcome
+
+    def apply_safe_state(self):
+        """
+        Run the recipe's safe_state actions. Every action is tried even if an
+        earlier one fails; the result is recorded as a 'safe state' stage.
+        """
+        if not self.safe_actions:
+            return
+        started = time.monotonic()
+        start_time = datetime.datetime.now()
+        print(f"[{self.name}] applying safe state at {start_time}")
+        outcome = "done"
+        with self.lock:
+            for action, func, args in self.safe_actions:
+                try:
+                    func(self.system, *args)
+                except Exception as e:
+                    print(f"[{self.name}] safe state: {action} failed: {e}")
+                    outcome = "failed"
+        self.record(self.cycle, "safe state", start_time, time.monotonic() - started, outcome)
+
+    # ---------------- Instrumentation ----------------
+    def record(self, cycle, stage, start_time, duration, outcome, waited=0.0):
+        timing = {"runner": self.name, "recipe": self.recipe.name, "cycle": cycle,
+                  "stage": stage, "start": start_time, "duration": duration,
+                  "outcome": outcome, "waited": waited}
+        self.timings.append(timing)
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(f"{self.name},{self.recipe.name},{cycle},{stage},"
+                        f"{start_time.isoformat()},{duration:.1f},{outcome},{waited:.1f}\n")
+
+    def stage_summary(self):
+        """
+        :return: Dictionary {stage: {'count', 'mean', 'min', 'max', 'timeouts', 'failures',
+                 'waited'}}, in seconds; 'waited' is the total time spent waiting for resources.
+        """
+        summary = {}
+        for t in self.timings:
+            s = summary.setdefault(t["stage"], {"count": 0, "total": 0.0, "min": None,
+                                                "max": None, "timeouts": 0, "failures": 0,
+                                                "waited": 0.0})
+            s["count"] += 1
+            s["total"] += t["duration"]
+            s["waited"] += t["waited"]
+            s["min"] = t["duration"] if s["min"] is None else min(s["min"], t["duration"])
+            s["max"] = t["duration"] if s["max"] is None else max(s["max"], t["duration"])
+            s["timeouts"] += t["outcome"] == "timeout"
+            s["failures"] += t["outcome"] == "failed"
+        for s in summary.values():
+            s["mean"] = s.pop("total") / s["count"]
+        return summary
+
+
+# ---------------- Scheduler ----------------
+class RecipeScheduler:
+    """
+    Runs the recipes of several systems concurrently.
+
+    Each system gets its own RecipeRunner thread; the ResourcePool they share
+    carries the constraints between them (e.g. only one system regenerating
+    at a time), so stages that do not conflict overlap instead of waiting for
+    the other system's whole cycle.
+    """
+
+    def __init__(self, resources):
+        """
+        :param resources: ResourcePool shared by the runners.
+        """
+        self.resources = resources
+        self.runners = []
+
+    def add(self, recipe, system, store, actions, resolve, **kwargs):
+        """
+        Compile a recipe for one system; arguments as for RecipeRunner.
+
+        :return: The new RecipeRunner.
+        """
+        runner = RecipeRunner(recipe, system, store, actions, resolve,
+                              resources=self.resources, **kwargs)
+        self.runners.append(runner)
+        return runner
+
+    def start(self):
+        """
+        Start the runners in the order they were added. Each one is started
+        once the previous one has entered its first stage, so the first
+        system added is the first to get contended resources.
+        """
+        for runner in self.runners:
+            runner.start()
+            runner.ready.wait()
+
+    def join(self):
+        for runner in self.runners:
+            runner.join()
+
+    def stop(self):
+        for runner in self.runners:
+            runner.stop()
+
+    def status(self):
+        """
+        :return: Dictionary {runner name: current stage, what it waits for,
+                 the error it stopped on, or None}.
+        """
+        waiting = self.resources.waiting()
+        status = {}
+        for runner in self.runners:
+            if runner.error is not None:
+                status[runner.name] = f"failed: {runner.error}"
+            elif runner.name in waiting:
+                status[runner.name] = f"waiting for {', '.join(waiting[runner.name])}"
+            else:
+                status[runner.name] = runner.current_stage
+        return status
@@ -0,0 +1,151 @@
+import numpy as np
+
+# Time constant of the estimates in seconds: a sample this old weighs 1/e
+TREND_TIME = 60.0
+# Effective number of samples (sum of weights) before a slope is reported
+MIN_WEIGHT = 3.0
+# A channel's time constant is stretched to at least this many of its own
+# sample intervals, so sparsely sampled channels still reach MIN_WEIGHT
+SAMPLES_PER_TREND = 2 * MIN_WEIGHT
+
+
+class TrendEstimator:
+    """
+    Streaming temperature trend of a group of channels.
+
+    Keeps, per channel, an exponentially weighted least-squares line through
+    the samples and an exponential moving average of the values. Only five
+    weighted sums are stored per channel, as NumPy arrays over all channels,
+    so update() costs the same few vector operations however long it runs,
+    and reading a slope costs nothing. The sums are kept relative to the time
+    of the newest sample, which keeps them well conditioned for any clock.
+
+    Channels that are NaN or missing in a sample are skipped for that sample
+    only; their older samples keep ageing. Each channel keeps the time of its
+    own last sample, so the moving average of a channel read every N-th
+    update still moves by the time elapsed since that channel's last value.
+    A channel sampled less often than time_constant / SAMPLES_PER_TREND
+    (a 372 scanner channel, or a slowly polled plate) uses a time constant of
+    SAMPLES_PER_TREND of its sample intervals instead, so it still gets a
+    slope, only a smoother one.
+    """
+
+    def __init__(self, channels=(), time_constant=TREND_TIME, min_weight=MIN_WEIGHT):
+        """
+        :param channels: Iterable of channel names; more are added as they appear.
+        :param time_constant: Seconds over which the weight of a sample falls to 1/e.
+        :param min_weight: Effective samples needed before a slope is reported.
+        """
+        self.time_constant = float(time_constant)
+        self.min_weight = min_weight
+        self._index = {}
+        self._last_time = None
+        # weighted sums of 1, t, t^2, y and t*y, with t relative to _last_time
+        self._sw, self._st, self._stt, self._sy, self._sty = (np.zeros(0) for _ in range(5))
+        self._ema = np.zeros(0)
+        # time of the last valid sample and seconds between the last two, per channel
+        self._seen = np.zeros(0)
+        self._interval = np.zeros(0)
+        for ch in channels:
+            self.add_channel(ch)
+
+    @property
+    def channels(self):
+        return list(self._index)
+
+    def add_channel(self, channel):
+        if channel in self._index:
+            return
+        self._index[channel] = len(self._index)
+        self._sw, self._st, self._stt, self._sy, self._sty = (
+            np.append(s, 0.0) for s in (self._sw, self._st, self._stt, self._sy, self._sty))
+        self._ema = np.append(self._ema, np.nan)
+        self._seen = np.append(self._seen, np.nan)
+        self._interval = np.append(self._interval, 0.0)
+
+    def time_constants(self):
+        """
+        :return: Array of the time constant in use for each channel, in seconds.
+        """
+        return np.maximum(self.time_constant, SAMPLES_PER_TREND * self._interval)
+
+    def update(self, t, values):
+        """
+        Add one sample.
+
+        :param t: Sample time in seconds; must not be earlier than the previous sample.
+        :param values: Dictionary {channel: value}, or a sequence of values in
+                       the order of `channels`.
+        """
+        if isinstance(values, dict):
+            for ch in values:
+                self.add_channel(ch)
+            row = np.full(len(self._index), np.nan)
+            for ch, value in values.items():
+                try:
+                    row[self._index[ch]] = np.nan if value is None else float(value)
+                except (TypeError, ValueError):
+                    pass
+        else:
+            row = np.asarray(values, dtype=float)
+
+        tau = self.time_constants()
+        if self._last_time is not None:
+            dt = max(0.0, t - self._last_time)
+            decay = np.exp(-dt / tau)
+            # move the time origin to t, then age the old samples
+            self._stt = decay * (self._stt - 2 * dt * self._st + dt * dt * self._sw)
+            self._sty = decay * (self._sty - dt * self._sy)
+            self._st = decay * (self._st - dt * self._sw)
+            self._sy *= decay
+            self._sw *= decay
+        self._last_time = t
+
+        # the new sample sits at t = 0, so only the sums of 1 and y change
+        valid = ~np.isnan(row)
+        self._sw[valid] += 1.0
+        self._sy[valid] += row[valid]
+
+        first = valid & np.isnan(self._ema)
+        self._ema[first] = row[first]
+        later = valid & ~first
+        # the average moves by the time since this channel's own last sample
+        elapsed = np.maximum(0.0, t - self._seen[later])
+        self._ema[later] += (1.0 - np.exp(-elapsed / tau[later])) * (row[later] - self._ema[later])
+        self._interval[later] = elapsed
+        self._seen[valid] = t
+
+    def slopes(self, per=1.0):
+        """
+        :param per: Time unit of the result in seconds (60 for K/min).
+        :return: Array of slopes in the order of `channels`; NaN where there
+                 are not yet enough samples.
+        """
+        det = self._sw * self._stt - self._st ** 2
+        ok = (self._sw >= self.min_weight) & (det > 1e-12 * self._sw * self._stt)
+        slopes = np.full(len(self._sw), np.nan)
+        slopes[ok] = (self._sw[ok] * self._sty[ok] - self._st[ok] * self._sy[ok]) / det[ok]
+        return slopes * per
+
+    def slope(self, channel, per=1.0, default=None):
+        """
+        :return: Current slope of a channel (value units per `per` seconds),
+                 or `default` if it is not known yet.
+        """
+        i = self._index.get(channel)
+        if i is None:
+            return default
+        sw, st, stt = self._sw[i], self._st[i], self._stt[i]
+        det = sw * stt - st ** 2
+        if sw < self.min_weight or not det > 1e-12 * sw * stt:
+            return default
+        return float((sw * self._sty[i] - st * self._sy[i]) / det * per)
+
+    def smoothed(self, channel, default=None):
+        """
+        :return: Exponential moving average of a channel, or `default`.
+        """
+        i = self._index.get(channel)
+        if i is None or np.isnan(self._ema[i]):
+            return default
+        return float(self._ema[i])
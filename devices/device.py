@@ -1,18 +1,16 @@
 import serial.tools.list_ports
-from threading import RLock
 
 from devices.CTC100 import CTC100Device
 from devices.lakeshore224device import LakeShore224Device
 from devices.lakeshore372device import LakeShore372Device
 
-# Global re-entrant lock used to synchronize access to serial devices
-device_lock = RLock()
-
 def connect_devices():
     """Scan serial ports and construct device wrappers. Returns dict of name->device.
 
     Each returned device is expected to expose the same methods used elsewhere
     (get_temperature, write_setpoint, set_still_voltage, etc.).
+    Calls into a device should go through its I/O worker
+    (devices.worker.get_worker(device)) so that each port is used by one thread.
     """
     ports = serial.tools.list_ports.comports()
 
@@ -1,3 +1,5 @@
+import time
+
 from lakeshore.model_372 import Model372, Model372HeaterOutputSettings
 
 
@@ -29,19 +31,35 @@ class LakeShore372Device:
     def get_output_channels(self):
         return self.output_channels
 
-    def get_temperature(self, channel):
+    def get_reading(self, channel):
+        """
+        Read temperature, resistance and reading status of a channel in one query.
+
+        :param channel: Input channel ('1' - '16', or 'A' for the control input).
+        :return: Dictionary with 'kelvin', 'resistance', 'status' (RDGST bit
+                 field, 0 when the reading is valid) and 'time' (acquisition
+                 time, seconds since the epoch), or None if the read failed.
+        """
         try:
-            if channel == 'A':
-                temp = self.device.get_all_input_readings(channel)['kelvin']
-            else:
-                temp = self.device.get_all_input_readings(int(channel))['kelvin']
-            return temp
+            channel = 'A' if channel == 'A' else int(channel)
+            response = self.device.query(f"KRDG? {channel};SRDG? {channel};RDGST? {channel}")
+            kelvin, resistance, status = response.split(';')[:3]
+            return {
+                'kelvin': float(kelvin),
+                'resistance': float(resistance),
+                'status': int(status),
+                'time': time.time(),
+            }
         except Exception as e:
             print(
-                f"Error reading temperature from Lake Shore 372 (Channel {channel}): {e}"
+                f"Error reading from Lake Shore 372 (Channel {channel}): {e}"
             )
             return None
 
+    def get_temperature(self, channel):
+        reading = self.get_reading(channel)
+        return reading['kelvin'] if reading is not None else None
+
     def read_all_channels(self):
         readings = {}
         for channel in self.input_channels:
@@ -62,17 +80,8 @@ class LakeShore372Device:
     #         print(f"Error setting heater output on Lake Shore 372: {e}")
             # return False
     def get_sensor(self, channel):
-        try:
-            if channel == 'A':
-                temp = self.device.get_all_input_readings(channel)['resistance']
-            else:
-                temp = self.device.get_all_input_readings(int(channel))['resistance']
-            return temp
-        except Exception as e:
-            print(
-                f"Error reading temperature from Lake Shore 372 (Channel {channel}): {e}"
-            )
-            return None
+        reading = self.get_reading(channel)
+        return reading['resistance'] if reading is not None else None
 
     def list_channels(self):
         """
@@ -104,3 +113,106 @@ class LakeShore372Device:
 
     def MC_heater_turn_off(self):
         self.device.set_heater_output_range(0, self.device.SampleHeaterOutputRange(0))
+
+
+class LakeShore372Scanner:
+    """
+    Drive the Lake Shore 372 scanner through a fixed channel sequence.
+
+    The 372 only measures the scanner channel it is currently parked on, so
+    querying the other channels just returns stale values. Instead, each
+    channel in the sequence is selected in turn and, once its settle time has
+    passed, read on every step until its dwell time is over. A sequence of one
+    channel simply parks the scanner there. The control input ('A') has its
+    own converter and is read on every step.
+
+    Each reading is stored as the record returned by get_reading(), which
+    carries kelvin, resistance, status and the time it was actually acquired.
+    """
+
+    DEFAULT_SETTLE = 4.0  # seconds after switching before the reading is valid
+    DEFAULT_DWELL = 5.0   # seconds spent on a channel, including the settle time
+
+    def __init__(self, device, sequence, control_input='A',
+                 settle=DEFAULT_SETTLE, dwell=DEFAULT_DWELL):
+        """
+        :param device: LakeShore372Device to drive.
+        :param sequence: Scanner channels to visit in order; each entry is a
+                         channel ('1' - '16') or a tuple (channel, dwell, settle).
+        :param control_input: Control input read on every step (None to skip).
+        :param settle: Default settle time in seconds.
+        :param dwell: Default dwell time in seconds.
+        """
+        self.device = device
+        self.control_input = control_input
+        self.sequence = []
+        for entry in sequence:
+            if isinstance(entry, (tuple, list)):
+                channel, ch_dwell, ch_settle = entry
+            else:
+                channel, ch_dwell, ch_settle = entry, dwell, settle
+            self.sequence.append((str(channel), max(ch_dwell, ch_settle), ch_settle))
+        self.latest = {}  # channel -> last reading record (see get_reading)
+        self._index = None
+        self._switched_at = None
+
+    @property
+    def current_channel(self):
+        if self._index is None:
+            return None
+        return self.sequence[self._index][0]
+
+    def _select(self, index, now):
+        channel = self.sequence[index][0]
+        if channel != self.current_channel:
+            # Park the scanner on the channel, autoscan off; the settle time
+            # only starts over when the channel actually changes
+            self.device.device.command(f"SCAN {int(channel)},0")
+            self._switched_at = now
+        self._index = index
+
+    def _read(self, channel):
+        reading = self.device.get_reading(channel)
+        if reading is not None:
+            self.latest[channel] = reading
+        return reading
+
+    def step(self, now=None):
+        """
+        Advance the scan and take any reading that is due.
+
+        Call this regularly (more often than the shortest dwell - settle
+        window) from the thread that owns the device.
+
+        :return: Dictionary {channel: reading record} of the readings
+                 taken during this step.
+        """
+        now = time.time() if now is None else now
+        fresh = {}
+
+        if self.control_input is not None:
+            if self._read(self.control_input) is not None:
+                fresh[self.control_input] = self.latest[self.control_input]
+
+        if not self.sequence:
+            return fresh
+        if self._index is None:
+            self._select(0, now)
+            return fresh
+
+        channel, dwell, settle = self.sequence[self._index]
+        elapsed = now - self._switched_at
+        if elapsed >= settle:
+            if self._read(channel) is not None:
+                fresh[channel] = self.latest[channel]
+        if elapsed >= dwell and len(self.sequence) > 1:
+            self._select((self._index + 1) % len(self.sequence), now)
+        return fresh
+
+    def latest_value(self, channel, default=None, field='kelvin'):
+        """
+        :param field: 'kelvin', 'resistance', 'status' or 'time'.
+        :return: Field of the last settled reading of a channel, or default if none yet.
+        """
+        reading = self.latest.get(str(channel))
+        return reading[field] if reading is not None else default
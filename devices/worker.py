@@ -0,0 +1,131 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Command classes, most urgent first. A queued call of a more urgent class
+# always runs before any queued call of a less urgent one.
+SAFETY = 0    # heater off, switch off, still off
+CONTROL = 1   # setpoints, switch voltages, heater on
+READOUT = 2   # routine temperature polling
+
+PRIORITY_NAMES = {SAFETY: "safety", CONTROL: "control", READOUT: "readout"}
+
+
+class DeviceWorker(threading.Thread):
+    """
+    Dedicated I/O thread for a single instrument.
+
+    Every call that talks to the instrument is queued here and executed on
+    this thread, so the serial port never sees two commands at once.
+    Different instruments have different workers and run in parallel.
+
+    Calls are ordered by priority class (SAFETY, CONTROL, READOUT) and then
+    by submission order. A running call is never interrupted, so a safety
+    command waits for at most the call in progress.
+    """
+
+    def __init__(self, device):
+        name = getattr(device, "name", None) or type(device).__name__
+        super().__init__(daemon=True, name=f"{name}-worker")
+        self.device = device
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        # Queueing delay per priority class: [count, total seconds, max seconds]
+        self._delays = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}
+        self._delays_lock = threading.Lock()
+
+    def submit(self, func, *args, priority=CONTROL, **kwargs):
+        """
+        Queue a call to run on this instrument's thread.
+
+        :param func: Callable to run, e.g. a bound device method.
+        :param priority: SAFETY, CONTROL (default) or READOUT.
+        :return: concurrent.futures.Future holding the result or exception.
+        """
+        future = Future()
+        if threading.current_thread() is self:
+            # Called from a job already running on this worker: run it now
+            # rather than waiting on ourselves.
+            self._execute(future, func, args, kwargs)
+        else:
+            self._queue.put((priority, next(self._sequence), time.monotonic(),
+                             (future, func, args, kwargs)))
+        return future
+
+    def call(self, func, *args, priority=CONTROL, timeout=None, **kwargs):
+        """
+        Run a call on this instrument's thread and wait for its result.
+
+        :param func: Callable to run, e.g. a bound device method.
+        :param priority: SAFETY, CONTROL (default) or READOUT.
+        :param timeout: Seconds to wait for the result (default: no limit).
+        :return: The value returned by func; exceptions are re-raised here.
+        """
+        return self.submit(func, *args, priority=priority, **kwargs).result(timeout)
+
+    def stop(self):
+        """
+        Stop the worker once the calls already queued have run.
+        """
+        self._queue.put((max(PRIORITY_NAMES) + 1, next(self._sequence), time.monotonic(), None))
+
+    def queue_stats(self):
+        """
+        Queueing delay statistics for each priority class.
+
+        :return: Dictionary {class name: {'count', 'mean', 'max'}}, delays in seconds.
+        """
+        with self._delays_lock:
+            return {
+                PRIORITY_NAMES[priority]: {
+                    "count": count,
+                    "mean": total / count if count else 0.0,
+                    "max": longest,
+                }
+                for priority, (count, total, longest) in self._delays.items()
+            }
+
+    def run(self):
+        while True:
+            priority, _, queued_at, item = self._queue.get()
+            if item is None:
+                break
+            delay = time.monotonic() - queued_at
+            with self._delays_lock:
+                stats = self._delays[priority]
+                stats[0] += 1
+                stats[1] += delay
+                stats[2] = max(stats[2], delay)
+            self._execute(*item)
+
+    @staticmethod
+    def _execute(future, func, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+
+# One worker per device object, created on first use
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_worker(device):
+    """
+    Return the I/O worker of a device, starting it if needed.
+
+    :param device: Device object (CTC100Device, LakeShore224Device, ...).
+    :return: The DeviceWorker that owns the device's port.
+    """
+    with _workers_lock:
+        worker = _workers.get(device)
+        if worker is None or not worker.is_alive():
+            worker = DeviceWorker(device)
+            worker.start()
+            _workers[device] = worker
+        return worker
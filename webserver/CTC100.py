@@ -10,23 +10,40 @@ class CTC100Device:
     while retaining all original functionality.
     """
 
-    def __init__(self, address, name = None):
+    # Replies are terminated by CR LF, commands by LF
+    TERMINATOR = b'\r\n'
+    # Default time allowed for a reply to arrive, in seconds
+    DEFAULT_TIMEOUT = 0.2
+    # 'getOutput' returns every channel value, so allow more time for it
+    SNAPSHOT_TIMEOUT = 0.5
+    # Failed snapshots in a row after which the device is reported stale
+    MAX_SNAPSHOT_FAILURES = 3
+
+    def __init__(self, address, name = None, timeout=DEFAULT_TIMEOUT, verify_cache=False):
         try:
             self.port = address
+            self.timeout = timeout
+            # Write-through cache of IOType, AIO voltage, PID mode and setpoint,
+            # keyed by variable name (e.g. 'AIO1.IOType')
+            self._state_cache = {}
+            self.verify_cache = verify_cache
             self.device = serial.Serial(
                 port=address,
-                timeout=0
+                timeout=timeout
             )
+            self._rx_buffer = bytearray()
+            self._snapshot_failures = 0
             time.sleep(1)
             self.address = address
             device_status = self.read_status()
             if not device_status:
                 raise Exception("No response from CTC100 device")
+            self.name = name
+            self.channel_names = []
             self.input_channels = []
             self.output_channels = []
             self.aio_channels = []
             self.list_channels()
-            self.name = name
             print(
                 f"Connected to CTC100 on {address} with input channels {self.input_channels}, "
                 f"output channels {self.output_channels}, and AIO channels {self.aio_channels}"
@@ -35,37 +52,65 @@ class CTC100Device:
             print(f"Error initializing CTC100Device on port {address}: {e}")
             raise e  # Re-raise the exception so it can be caught in setup_devices()
 
-    def write(self, command):
+    def write(self, command, timeout=None):
         """
         Send a command to the CTC100 over serial and read the response.
 
         :param command: Command string to send.
+        :param timeout: Time in seconds to wait for the reply (defaults to self.timeout).
         :return: Response from the device.
         """
+        # Drop anything left over from a reply that arrived after its deadline,
+        # so it cannot be mistaken for the answer to this command.
+        self._rx_buffer.clear()
+        self.device.reset_input_buffer()
         self.device.write((command + "\n").encode())  # \n terminates commands
-        # Read the response
-        t1 = time.time()
-        response = b''
-        while True:
-            response += self.device.read(self.device.in_waiting or 1)
-            if response.endswith(b'\r\n'):
-                break
-            t2 = time.time()
-            if (t2 - t1) > 0.2:  # Timeout after 1 second
-                break
-        # self.device.reset_input_buffer()
-        # self.device.reset_output_buffer()
+        return self.read_line(timeout)
+
+    def read_line(self, timeout=None):
+        """
+        Block until a full CR LF terminated reply has arrived or the deadline passes.
+
+        The serial read blocks inside the driver, so no CPU is used while waiting.
+        Bytes already buffered from an earlier read are used first.
+
+        :param timeout: Time in seconds to wait (defaults to self.timeout).
+        :return: The reply including its terminator, or whatever arrived before the deadline.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        buffer = self._rx_buffer
+        end = buffer.find(self.TERMINATOR)
+        if end < 0:
+            # pyserial reconfigures the port on every timeout assignment,
+            # so only touch it when the timeout actually changes
+            if self.device.timeout != timeout:
+                self.device.timeout = timeout
+            # read_until applies the timeout to the whole call and stops
+            # right after the terminator
+            start = max(len(buffer) - len(self.TERMINATOR) + 1, 0)
+            buffer += self.device.read_until(self.TERMINATOR)
+            end = buffer.find(self.TERMINATOR, start)
+            if end < 0:
+                # Timed out: hand back the partial reply, as before
+                response = bytes(buffer)
+                buffer.clear()
+                return response
+        end += len(self.TERMINATOR)
+        response = bytes(buffer[:end])
+        del buffer[:end]
         return response
 
-    def get_variable(self, var):
+    def get_variable(self, var, timeout=None):
         """
         Read a parameter from the CTC100.
 
         :param var: Variable name.
+        :param timeout: Time in seconds to wait for the reply (defaults to self.timeout).
         :return: Value of the variable.
         """
         var = var.replace(" ", "")  # Remove spaces from the variable name
-        return self.write("{}?".format(var))
+        return self.write("{}?".format(var), timeout)
 
     def set_variable(self, var, val):
         """
@@ -76,6 +121,7 @@ class CTC100Device:
         :return: Response from the device.
         """
         var = var.replace(" ", "")
+        self._state_cache.pop(var, None)
         val = "({})".format(val)
         return self.write("{} = {}".format(var, val))
 
@@ -88,9 +134,43 @@ class CTC100Device:
         :return: Response from the device.
         """
         var = var.replace(" ", "")
+        self._state_cache.pop(var, None)
         val = "({})".format(val)
         return self.write("{} += {}".format(var, val))
 
+    def cached_variable(self, var, query):
+        """
+        Return a cached device setting, querying the device only when needed.
+
+        In verify mode the device is always queried, and a warning is printed
+        if the reply disagrees with the cached value.
+
+        :param var: Variable name used as the cache key (e.g. 'AIO1.IOType').
+        :param query: Callable returning the value read from the device.
+        :return: Value of the variable.
+        """
+        if not self.verify_cache and var in self._state_cache:
+            return self._state_cache[var]
+        value = query()
+        if var in self._state_cache and self._state_cache[var] != value:
+            print(f"CTC100 {self.name}: cached {var}={self._state_cache[var]!r} "
+                  f"but device reports {value!r}")
+        self._state_cache[var] = value
+        return value
+
+    def invalidate_cache(self, channel=None):
+        """
+        Forget cached settings, so the next read queries the device.
+
+        :param channel: Only forget settings of this channel (default: all channels).
+        """
+        if channel is None:
+            self._state_cache.clear()
+            return
+        prefix = f"{channel}."
+        for var in [var for var in self._state_cache if var.startswith(prefix)]:
+            del self._state_cache[var]
+
     def setAlarm(self, channel, Tmin, Tmax):
         """
         Enable and configure an alarm on a channel within specified temperature limits.
@@ -164,11 +244,53 @@ class CTC100Device:
 
         :return: Dictionary with channel names as keys and readings as values.
         """
-        readings = {}
-        for channel in self.input_channels + self.aio_channels:
-            temp = self.get_temperature(channel)
-            readings[channel] = temp
-        return readings
+        snapshot = self.read_snapshot()
+        return {channel: snapshot.get(channel)
+                for channel in self.input_channels + self.aio_channels}
+
+    def read_snapshot(self):
+        """
+        Read the values of every input, output and AIO channel in one exchange.
+
+        'getOutput' returns all channel values as a comma separated list, in the
+        same order as the names returned by 'getOutput.names'.
+
+        A failed exchange gives a sample with every value None, which readers
+        treat as missing; after MAX_SNAPSHOT_FAILURES failures in a row the
+        device is reported stale (see `stale`) until a snapshot succeeds.
+
+        :return: Dictionary with channel names as keys and readings as values
+                 (None for values that could not be parsed).
+        """
+        try:
+            response = self.get_variable('getOutput', self.SNAPSHOT_TIMEOUT)
+            decoded_response = response.decode().strip()
+            decoded_response = decoded_response.replace('getOutput', '')
+            values = [value.strip() for value in decoded_response.split(',')]
+            if len(values) != len(self.channel_names):
+                raise RuntimeError(
+                    f"Expected {len(self.channel_names)} values, got {len(values)}")
+        except Exception as e:
+            self._snapshot_failures += 1
+            print(f"Error reading snapshot from CTC100 {self.name} "
+                  f"({self._snapshot_failures} in a row): {e}")
+            return {name: None for name in self.channel_names}
+        if self.stale:
+            print(f"CTC100 {self.name} is answering again")
+        self._snapshot_failures = 0
+
+        snapshot = {}
+        for name, value in zip(self.channel_names, values):
+            match = re.search(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", value)
+            snapshot[name] = float(match.group()) if match else None
+        return snapshot
+
+    @property
+    def stale(self):
+        """
+        True while the last MAX_SNAPSHOT_FAILURES snapshots or more all failed.
+        """
+        return self._snapshot_failures >= self.MAX_SNAPSHOT_FAILURES
 
     def enable_heater(self):
         """
@@ -191,6 +313,7 @@ class CTC100Device:
         :return: True if successful, False otherwise.
         """
         try:
+            self._state_cache.pop(f"{channel}.Value", None)
             self.write(f'{channel}.Value {value}')
             return True
         except Exception as e:
@@ -221,7 +344,22 @@ class CTC100Device:
         if mode not in ['Off', 'On', 'Follow']:
             raise ValueError(
                 "Invalid control mode. Must be 'Off', 'On', or 'Follow'.")
-        return self.set_variable(f"{channel}.PID.Mode", mode)
+        response = self.set_variable(f"{channel}.PID.Mode", mode)
+        self._state_cache[f"{channel}.PID.Mode"] = mode
+        return response
+
+    def get_PID_mode(self, channel):
+        """
+        Get the PID mode of an output channel.
+
+        :param channel: Output channel name (e.g. 'Out1').
+        :return: PID mode ('Off', 'On' or 'Follow').
+        """
+        def query():
+            response = self.get_variable(f"{channel}.PID.Mode").decode().strip()
+            match = re.search(r"(Off|On|Follow)", response)
+            return match.group(1) if match else response
+        return self.cached_variable(f"{channel}.PID.Mode", query)
 
     def enable_PID(self, channel):
         """
@@ -247,7 +385,9 @@ class CTC100Device:
         :param setpoint: Setpoint value in Kelvin.
         :return: Response from the device.
         """
-        return self.set_variable(f"{channel}.PID.Setpoint", setpoint)
+        response = self.set_variable(f"{channel}.PID.Setpoint", setpoint)
+        self._state_cache[f"{channel}.PID.Setpoint"] = float(setpoint)
+        return response
 
     def read_setpoint(self, channel):
         """
@@ -256,13 +396,15 @@ class CTC100Device:
         :param channel: Output channel number (1 or 2).
         :return: Setpoint value.
         """
-        response = self.get_variable(f"Out{channel}.PID.Setpoint")
-        match = re.search(r"[-+]?\d*\.\d+(?:[eE][-+]?\d+)?",
-                          response.decode("utf-8"))
-        if match is not None:
-            return float(match.group())
-        else:
-            raise RuntimeError(f"Unable to read setpoint from Out{channel}")
+        def query():
+            response = self.get_variable(f"Out{channel}.PID.Setpoint")
+            match = re.search(r"[-+]?\d*\.\d+(?:[eE][-+]?\d+)?",
+                              response.decode("utf-8"))
+            if match is not None:
+                return float(match.group())
+            else:
+                raise RuntimeError(f"Unable to read setpoint from Out{channel}")
+        return self.cached_variable(f"Out{channel}.PID.Setpoint", query)
 
     def tune_PID(self, channel, StepY, Lag):
         """
@@ -283,6 +425,7 @@ class CTC100Device:
         time.sleep(Lag + 3*Lag)  # Adding extra time for safety
 
         # Check if tuning was successful
+        self.invalidate_cache(channel)  # tuning changes the PID settings
         response = self.get_variable(f"{channel}.PID.Mode").decode()
         if "On" in response:
             print("PID tuning was successful! The parameters have been updated.")
@@ -349,8 +492,8 @@ class CTC100Device:
             decoded_response = decoded_response.replace('getOutput.names', '')
             channel_names = [name.strip()
                             for name in decoded_response.split(',') if name.strip()]
+            self.channel_names = channel_names
 
-            
             for i,name in enumerate(channel_names):
                 if i <4:
                     self.input_channels.append(name)
@@ -406,6 +549,7 @@ class CTC100Device:
 
         # Construct the command without an '='
         command = f"{output_channel}.PID.Input {input_channel_name}"
+        self.invalidate_cache(output_channel)
         response = self.send_command(command)
 
         # Enable PID control
@@ -424,33 +568,40 @@ class CTC100Device:
         """
         if not isinstance(channel, str):
             channel = f"{channel}"
-        response = self.get_variable(f"{channel}.IOType")
-        # Extract the IOType from the response
-        response_str = response.decode().strip()
-        match = re.search(rf"{channel}.IOType=(.*)", response_str)
-        if match:
-            iotype = match.group(1).strip()
-            return iotype
-        else:
-            # If response doesn't contain '=', try parsing the raw response
-            return response_str
+
+        def query():
+            response = self.get_variable(f"{channel}.IOType")
+            # Extract the IOType from the response
+            response_str = response.decode().strip()
+            match = re.search(rf"{channel}.IOType=(.*)", response_str)
+            if match:
+                iotype = match.group(1).strip()
+                return iotype
+            else:
+                # If response doesn't contain '=', try parsing the raw response
+                return response_str
+        return self.cached_variable(f"{channel}.IOType", query)
 
     def set_aio_iotype(self, channel, iotype):
         """
         Set the IOType of an AIO channel.
 
         :param channel: AIO channel number or name (e.g., 'AIO1' or 1).
-        :param iotype: IOType to set ('Input', 'Set out', or 'Meas out').
+        :param iotype: IOType to set ('Input', 'Set out', or 'Meas out', any case).
         :return: Response from the device.
         """
-        valid_iotypes = ['Input', 'Set Out', 'Meas out']
-        if iotype not in valid_iotypes:
+        valid_iotypes = ['Input', 'Set out', 'Meas out']
+        # Accept any capitalisation, but store the spelling the device reports
+        canonical = {name.lower(): name for name in valid_iotypes}
+        if iotype.lower() not in canonical:
             raise ValueError(
                 f"Invalid IOType. Must be one of {valid_iotypes}.")
+        iotype = canonical[iotype.lower()]
         if not isinstance(channel, str):
             channel = f"{channel}"
         # Set the IOType using the appropriate format
         response = self.set_variable(f"{channel}.IOType", f'"{iotype}"')
+        self._state_cache[f"{channel}.IOType"] = iotype
         return response
 
     def get_aio_voltage(self, channel):
@@ -467,15 +618,18 @@ class CTC100Device:
         if iotype != 'Set out':
             raise RuntimeError(
                 f"{channel} is not configured as 'Set out'. Current IOType: {iotype}")
-        response = self.get_variable(f"{channel}.Value")
-        # Extract the voltage value from the response
-        match = re.search(r"[-+]?\d*\.\d+(?:[eE][-+]?\d+)?",
-                          response.decode("utf-8"))
-        if match:
-            voltage = float(match.group())
-            return voltage
-        else:
-            raise RuntimeError(f"Unable to read voltage from {channel}")
+
+        def query():
+            response = self.get_variable(f"{channel}.Value")
+            # Extract the voltage value from the response
+            match = re.search(r"[-+]?\d*\.\d+(?:[eE][-+]?\d+)?",
+                              response.decode("utf-8"))
+            if match:
+                voltage = float(match.group())
+                return voltage
+            else:
+                raise RuntimeError(f"Unable to read voltage from {channel}")
+        return self.cached_variable(f"{channel}.Value", query)
 
     def set_aio_voltage(self, channel, voltage):
         """
@@ -496,6 +650,7 @@ class CTC100Device:
                 f"{channel} is not configured as 'Set out'. Current IOType: {iotype}")
         # Set the voltage using the appropriate command
         response = self.set_variable(f"{channel}.Value", voltage)
+        self._state_cache[f"{channel}.Value"] = float(voltage)
         return response
 
     def send_command(self, command):
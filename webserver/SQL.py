@@ -1,4 +1,5 @@
 import psycopg2
+import psycopg2.extras
 import datetime
 import time
 import numpy as np
@@ -15,6 +16,12 @@ class SQL:
         db = options[3]
         print("SQL: Connecting to postgres database = %s with username = %s, port = %d, host = %s" % (db,user,port,host))
         psqlConnect = "dbname=%s user=%s host=%s port=%d" % (db,user,host,port)
+        # name <-> scid cache of slow_control_items, loaded on first use
+        self.scidByName = None
+        self.nameBySCID = None
+        # names already looked up and found missing; they do not trigger
+        # another reload of the table
+        self.unknownNames = set()
         try:
             self.db = psycopg2.connect(psqlConnect)
             self.schema = 'public.'
@@ -58,19 +65,62 @@ class SQL:
                 print("SQL(): lastUpdate() = %s" % (row))
             return row
 
-    def getSCID(self,name):
-        sql = "select * from %sslow_control_items where name='%s'" % (self.schema,name)
+    def refreshSCIDs(self):
+        # (Re)load the whole name <-> scid table in one query
+        sql = "select scid,name from %sslow_control_items" % (self.schema)
         if (self.Debug):
-            print("SQL(): getSCID: %s" % (sql))
+            print("SQL(): refreshSCIDs: %s" % (sql))
         self.DBconn.execute(sql)
-        if (self.DBconn.rowcount != 1):
-            print("ERROR: SQL(): getSCID(%s) did not return exactly one row" % (name))
+        rows = self.DBconn.fetchall()
+        self.scidByName = {name: int(scid) for scid, name in rows}
+        self.nameBySCID = {int(scid): name for scid, name in rows}
+        if (self.Debug):
+            print("SQL(): refreshSCIDs() loaded %d items" % (len(rows)))
+
+    def registerSC(self,name):
+        # Add a new slow control item and return its scid (-1 on failure)
+        sql = "insert into %sslow_control_items (name) values (%%s) returning scid" % (self.schema)
+        if (self.Debug):
+            print("SQL(): registerSC(%s)" % (name))
+        try:
+            self.DBconn.execute(sql, (name,))
+            scid = int(self.DBconn.fetchone()[0])
+            self.db.commit()
+        except psycopg2.Error as e:
+            print("ERROR: SQL(): registerSC(%s) failed: %s" % (name, e))
+            self.db.rollback()
             return int(-1)
-        else:
-            row = self.DBconn.fetchone()[0]
-            if (self.Debug):
-                print("SQL(): getSCID(%s) = %d" % (name,row))
-            return int(row)
+        self.scidByName[name] = scid
+        self.nameBySCID[scid] = name
+        self.unknownNames.discard(name)
+        print("SQL(): registered new slow control item %s = %d" % (name, scid))
+        return scid
+
+    def getSCIDs(self,names,register=False):
+        # Resolve many names at once from the cache. Names not in the cache
+        # trigger one reload (another writer may have added them) and are
+        # then registered if still missing and register is set. Unresolved
+        # names map to -1; they are reported and remembered once, so asking
+        # for them again does not reload the table (refreshSCIDs() still
+        # picks them up if they are added later).
+        if self.scidByName is None:
+            self.refreshSCIDs()
+        missing = [name for name in names if name not in self.scidByName
+                   and (register or name not in self.unknownNames)]
+        if missing:
+            self.refreshSCIDs()
+            for name in missing:
+                if name in self.scidByName:
+                    continue
+                if register:
+                    self.registerSC(name)
+                else:
+                    print("ERROR: SQL(): getSCID(%s) found no slow control item" % (name))
+                    self.unknownNames.add(name)
+        return {name: self.scidByName.get(name, int(-1)) for name in names}
+
+    def getSCID(self,name,register=False):
+        return self.getSCIDs([name], register)[name]
 
     def insertSCValueByID(self, scid, value, timestamp):
         sql = "insert into slow_control_data (scid,value,time) values (%d,%f,'%s')" % (scid, value, timestamp)
@@ -91,37 +141,57 @@ class SQL:
         self.insertSCValueByID(scid, value, timestamp)
         
 
+    def insertSCRows(self, rows, page_size=1000):
+        # rows: iterable of (scid, value, timestamp); all are written by
+        # multi-row INSERTs in a single transaction. Returns the number of
+        # rows written, or -1 if the transaction failed and was rolled back.
+        rows = list(rows)
+        if not rows:
+            return 0
+        sql = "insert into slow_control_data (scid,value,time) values %s"
+        if (self.Debug):
+            print("SQL(): insertSCRows: %d rows" % (len(rows)))
+        try:
+            psycopg2.extras.execute_values(self.DBconn, sql, rows, page_size=page_size)
+            self.db.commit()
+        except psycopg2.Error as e:
+            print("Bulk insert failed:", e)
+            self.db.rollback()
+            return int(-1)
+        return len(rows)
+
+    def insertSCRowsByName(self, rows):
+        # rows: iterable of (name, value, timestamp). Names are resolved from
+        # the scid cache; rows whose name is not a registered slow control
+        # item are dropped, never registered behind the caller's back.
+        # Returns as insertSCRows: 0 if nothing was insertable, -1 on failure.
+        rows = list(rows)
+        scids = self.getSCIDs(set(r[0] for r in rows))
+        return self.insertSCRows(
+            (scids[name], value, ts) for name, value, ts in rows if scids[name] >= 0)
+
     def insertSCValuesByIDs(self,scids,values,timestamps=None):
         if timestamps is None:
             timestamps = [datetime.datetime.now() for _ in values]
 
-        for scid, value, ts in zip(scids, values, timestamps):
-            self.insertSCValueByID(scid, value, ts)
+        return self.insertSCRows(zip(scids, values, timestamps))
 
     def insertSCValuesByNames(self,names,values,timestamps=None):
         if timestamps is None:
             timestamps = [datetime.datetime.now() for _ in values]
 
-        for name, value, ts in zip(names, values, timestamps):
-            self.insertSCValueByName(name, value, ts)
+        return self.insertSCRowsByName(zip(names, values, timestamps))
             
 
     def getSCNames(self,scids):
+        if self.nameBySCID is None or any(scid not in self.nameBySCID for scid in scids):
+            self.refreshSCIDs()
         data = []
         for scid in scids:
-            sql = "select name from %sslow_control_items where scid=%d" % (self.schema,scid)
-            if (self.Debug):
-                print("SQL(): getSCNames: %s" % (sql))
-            self.DBconn.execute(sql)
-            if (self.DBconn.rowcount != 1):
+            if scid not in self.nameBySCID:
                 print("ERROR: SQL(): getSCNames(%d) did not return exactly one row" % (scid))
                 return int(-1)
-            else:
-                row = self.DBconn.fetchone()[0]
-                data.append(row)        
-                if (self.Debug):
-                    print("SQL(): getSCNames(%d) = %s" % (scid,row))
-                    
+            data.append(self.nameBySCID[scid])
         return data
 
     def getSCTimes(self,start_time):
@@ -140,43 +210,53 @@ class SQL:
         return data   
 
         
-    def getSCValues(self,scids,start_time):
-        num = len(scids)
-        dicts = [dict() for i in range(num)]
-        limit = 10000000
+    def getSCValues(self,scids,start_time,fetch_size=100000,after=False):
+        # All samples of the given scids from start_time on (strictly after
+        # it if after=True), in one query.
+        # Rows are streamed from a server-side (named) cursor in blocks of
+        # fetch_size and pivoted with NumPy onto the common time index.
+        # Returns (times, values): times is the sorted array of distinct
+        # sample times and values[:, i] the column of scids[i], NaN where
+        # that channel has no sample at that time.
+        scids = [int(scid) for scid in scids]
+        sql = "select scid,time,value from %sslow_control_data where scid = ANY(%%s) and time %s %%s order by time" % (self.schema, ">" if after else ">=")
+        if (self.Debug):
+            print("SQL(): getSCValues: %s %s %s" % (sql,scids,start_time))
 
-        data = []
-            
-        for scid in scids:
-            sql = "select scid,time,value from %sslow_control_data where scid=%d and time>= %d order by time limit %d" % (self.schema,scid,start_time,limit)
+        blocks = []
+        cursor = self.db.cursor(name="getSCValues")
+        cursor.itersize = fetch_size
+        try:
+            cursor.execute(sql, (scids, start_time))
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                block_scids, block_times, block_values = zip(*rows)
+                blocks.append((np.asarray(block_scids, dtype=np.int64),
+                               np.asarray(block_times),
+                               np.asarray(block_values, dtype=float)))
+        finally:
+            cursor.close()
+            # end the read transaction the named cursor lives in
+            self.db.commit()
+
+        if not blocks:
             if (self.Debug):
-                print("SQL(): getSCValues: %s" % (sql))
-            self.DBconn.execute(sql)
-            if (self.DBconn.rowcount < 1):
-                print("ERROR: SQL(): getSCValues(%s) returned no rows" % (scid))
-            else:    
-                rows = self.DBconn.fetchall()
-                for row in rows:
-#                    print row
-                    scid  = row[0]
-                    time = row[1]
-                    value = row[2]
-                    for i in range(num):
-                        if (scid == scids[i]):
-                            dicts[i][time] = value
-#     Loop over times in 1st dict and then get values from subsequent dicts and create the structure and put in data[]
-
-        times = sorted(dicts[0].keys())
-        for time in times:
-            d = {
-                'time' : time }
-            for i in range(num):
-                value = dicts[i].get(time,-10)
-                str = "value-%d" % (i+1)
-                v = { str : value }
-                d.update(v)
-            data.append(d)
-        return data
-        
+                print("SQL(): getSCValues(%s) returned no rows" % (scids))
+            return np.array([]), np.empty((0, len(scids)))
+
+        row_scids = np.concatenate([b[0] for b in blocks])
+        row_times = np.concatenate([b[1] for b in blocks])
+        row_values = np.concatenate([b[2] for b in blocks])
+
+        times, time_index = np.unique(row_times, return_inverse=True)
+        order = np.argsort(scids)
+        column = order[np.searchsorted(np.asarray(scids)[order], row_scids)]
+
+        values = np.full((len(times), len(scids)), np.nan)
+        values[time_index, column] = row_values
+        return times, values
+
     def close(self):
         self.db.close()
@@ -0,0 +1,104 @@
+# broadcast.py
+# Fan-out of reading batches from the readout thread to live subscribers.
+import threading
+import time
+from collections import deque
+
+# Batches a subscriber may fall behind by before new ones are coalesced
+MAX_PENDING = 32
+
+
+class Subscription:
+    """
+    Pending reading batches for one subscriber.
+
+    The readout thread only ever appends here, so a slow subscriber can never
+    stall it. Once MAX_PENDING batches are waiting, each new batch is merged
+    into the newest pending one (latest value per channel wins), so the
+    subscriber still sees the current state, just at a coarser time step.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING, notify=None):
+        """
+        :param max_pending: Batches kept before coalescing starts.
+        :param notify: Callable run (on the publishing thread) after each new batch.
+        """
+        self.max_pending = max_pending
+        self.notify = notify
+        self.coalesced = 0
+        self._batches = deque()
+        self._lock = threading.Lock()
+
+    def put(self, batch):
+        with self._lock:
+            if len(self._batches) < self.max_pending:
+                self._batches.append(batch)
+            else:
+                newest = self._batches[-1]
+                newest["time"] = batch["time"]
+                for device, channels in batch["readings"].items():
+                    newest["readings"].setdefault(device, {}).update(channels)
+                self.coalesced += 1
+        if self.notify is not None:
+            self.notify()
+
+    def take(self):
+        """
+        :return: List of all pending batches, oldest first; clears the queue.
+        """
+        with self._lock:
+            batches = list(self._batches)
+            self._batches.clear()
+        return batches
+
+
+class ReadingBroadcaster:
+    """
+    Publishes each readout batch to every current subscriber.
+
+    A batch is {'time': unix time, 'readings': {device: {channel: value}}}.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, notify=None):
+        """
+        :param notify: Callable run after each batch is queued for this subscriber.
+        :return: A new Subscription.
+        """
+        subscription = Subscription(self.max_pending, notify)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, readings, timestamp=None):
+        """
+        Queue a batch of readings for every subscriber.
+
+        :param readings: Dictionary {device: {channel: value}}.
+        :param timestamp: Unix time of the readings (default: now).
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            # every subscriber gets its own copy, since coalescing mutates it
+            batch = {"time": timestamp,
+                     "readings": {dev: dict(chs) for dev, chs in readings.items()}}
+            try:
+                subscription.put(batch)
+            except Exception as e:
+                print(f"[Broadcaster] Dropping subscriber: {e}")
+                self.unsubscribe(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
@@ -1,24 +1,29 @@
+import asyncio
 import threading
-import socket
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from cooldown_loop_dilution_v2 import switch_on, switch_off, heater_on, heater_off
 from device import get_channels_for_device
+from worker import get_worker, SAFETY, CONTROL
+from framing import encode_frame, read_frame
 
-# If your real device_lock exists, import it.
-# Otherwise assign a new lock:
-try:
-    from devices.device import device_lock as hardware_lock
-except ImportError:
-    hardware_lock = threading.Lock()
+# Seconds a live subscriber may take to accept data before it is dropped
+SUBSCRIBER_TIMEOUT = 10.0
 
 class DeviceControllerClient(threading.Thread):
-    def __init__(self, devices: dict, host: str, port: int):
+    def __init__(self, devices: dict, host: str, port: int, broadcaster=None):
         super().__init__(daemon=True)
         self.devices = devices
+        # Source of live reading batches for "subscribe" requests
+        self.broadcaster = broadcaster
         self.host = host
         self.port = port
         self.stop_flag = threading.Event()
+        # Threads that wait on device workers; one per device keeps every
+        # instrument busy, the rest absorb queued requests for the same one
+        self.executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(devices)),
+                                           thread_name_prefix="controller")
 
         self.func_dict = {
             "set_switch_voltage": self.set_switch_voltage,
@@ -34,44 +39,40 @@ class DeviceControllerClient(threading.Thread):
     # ---------------- Switch Commands ----------------
     def set_switch_voltage(self, device_name, channel, voltage):
         device = self.devices[device_name]
-        with hardware_lock:
-            switch_on(device, channel, voltage)
+        get_worker(device).call(switch_on, device, channel, voltage, priority=CONTROL)
 
     def turn_off_switch(self, device_name, channel, _):
         device = self.devices[device_name]
-        with hardware_lock:
-            switch_off(device, channel)
+        get_worker(device).call(switch_off, device, channel, priority=SAFETY)
 
     # ---------------- Heater Commands ----------------
     def set_heater_temperature(self, device_name, channel, temperature):
         device = self.devices[device_name]
-        with hardware_lock:
+
+        def action():
             device.write_setpoint(channel, temperature)
             heater_on(device, channel)
+        get_worker(device).call(action, priority=CONTROL)
 
     def turn_off_heater(self, device_name, channel, _):
         device = self.devices[device_name]
-        with hardware_lock:
-            heater_off(device, channel)
+        get_worker(device).call(heater_off, device, channel, priority=SAFETY)
 
     def toggle_heater(self, device_name, channel, state):
         device = self.devices[device_name]
-        with hardware_lock:
-            if state == "1":
-                heater_on(device, channel)
-            else:
-                heater_off(device, channel)
+        if state == "1":
+            get_worker(device).call(heater_on, device, channel, priority=CONTROL)
+        else:
+            get_worker(device).call(heater_off, device, channel, priority=SAFETY)
 
     # ---------------- Still Heater ----------------
     def set_still_percentage(self, device_name, channel, percent):
         device = self.devices[device_name]
-        with hardware_lock:
-            device.set_still_voltage(percent)
+        get_worker(device).call(device.set_still_voltage, percent, priority=CONTROL)
 
     def turn_off_still(self, device_name, channel, _):
         device = self.devices[device_name]
-        with hardware_lock:
-            device.set_still_voltage(0)
+        get_worker(device).call(device.set_still_voltage, 0, priority=SAFETY)
 
     # ---------------- Device List ----------------
     def get_devices(self, *_ignored):
@@ -109,28 +110,113 @@ class DeviceControllerClient(threading.Thread):
 
         return "0"
 
+    # --------------- Connection Handling ----------------
+    async def handle_request(self, frame, writer):
+        # Each frame is "<id> <command>"; the reply is "<id> <result>".
+        # Replies go out as soon as they are ready, so a slow command on one
+        # instrument does not hold up commands to the others.
+        req_id, _, cmd = frame.partition(" ")
+        print("[Client] Received:", req_id, cmd)
+        loop = asyncio.get_running_loop()
+        try:
+            # The command blocks on the device's worker; run it off the
+            # event loop so requests for different devices overlap
+            result = await loop.run_in_executor(self.executor, self.handle_cmd, cmd)
+        except Exception as e:
+            print(f"[Client] ERROR: {e}")
+            result = "1"
+        writer.write(encode_frame(f"{req_id} {result}"))
+        await writer.drain()
+
+    async def stream_readings(self, req_id, writer):
+        # "<id> subscribe" is acknowledged with "<id> 0", then every reading
+        # batch follows as "<id> <json>" until the connection closes
+        if self.broadcaster is None:
+            writer.write(encode_frame(f"{req_id} 1"))
+            return
+
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def notify():
+            # runs on the readout thread
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass    # event loop already closed
+
+        subscription = self.broadcaster.subscribe(notify)
+        addr = writer.get_extra_info("peername")
+        print(f"[Client] Live subscriber {addr} connected")
+        try:
+            writer.write(encode_frame(f"{req_id} 0"))
+            while not writer.is_closing():
+                await ready.wait()
+                ready.clear()
+                for batch in subscription.take():
+                    writer.write(encode_frame(f"{req_id} {json.dumps(batch)}"))
+                # A subscriber that stops reading is dropped rather than
+                # letting its backlog grow
+                await asyncio.wait_for(writer.drain(), SUBSCRIBER_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[Client] Dropping slow live subscriber {addr}")
+            writer.close()
+        except OSError as e:
+            print(f"[Client] Live subscriber {addr} failed: {e}")
+        finally:
+            self.broadcaster.unsubscribe(subscription)
+            if subscription.coalesced:
+                print(f"[Client] Live subscriber {addr}: {subscription.coalesced} batches coalesced")
+
+    async def serve_connection(self, reader, writer):
+        # A connection stays open and carries any number of pipelined
+        # requests, answered in whatever order they complete
+        addr = writer.get_extra_info("peername")
+        pending = set()
+        streams = set()
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while not self.stop_flag.is_set():
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                req_id, _, cmd = frame.partition(" ")
+                if cmd.strip() == "subscribe":
+                    task = asyncio.create_task(self.stream_readings(req_id, writer))
+                    streams.add(task)
+                else:
+                    task = asyncio.create_task(self.handle_request(frame, writer))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            for task in streams:
+                task.cancel()
+            if pending or streams:
+                await asyncio.gather(*pending, *streams, return_exceptions=True)
+        except OSError as e:
+            print(f"[Client] Connection from {addr} failed: {e}")
+        finally:
+            self.connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def serve(self):
+        self.connections = {}
+        server = await asyncio.start_server(self.serve_connection, self.host, self.port,
+                                            reuse_address=True)
+        print("[Client] Ready for commands...")
+        async with server:
+            while not self.stop_flag.is_set():
+                await asyncio.sleep(0.1)
+            # Closing the sockets ends each connection's read loop
+            for writer in list(self.connections.values()):
+                writer.close()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+
     # --------------- Thread Loop ----------------
     def run(self):
-        with socket.socket() as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.bind((self.host, self.port))
-            s.listen()
-            print("[Client] Ready for commands...")
-
-            while not self.stop_flag.is_set():
-                try:
-                    s.settimeout(0.1)
-                    conn, addr = s.accept()
-                except socket.timeout:
-                    continue
-
-                with conn:
-                    cmd = conn.recv(1024).decode("ascii")
-                    print("[Client] Received:", cmd)
-                    try:
-                        result = self.handle_cmd(cmd)
-                    except Exception as e:
-                        print(f"[Client] ERROR: {e}")
-                        result = "1"
-                    conn.sendall(result.encode("ascii"))
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.executor.shutdown(wait=False)
 
+    def stop(self):
+        self.stop_flag.set()
@@ -1,11 +1,25 @@
 import socket
 import time
 import json
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from framing import send_frame, recv_frame
 
 class DeviceControllerServer:
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, pool_size: int = 4, timeout: float = 2.0):
         self.host = host
         self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        # Persistent connections to the macbox controller. Each one carries
+        # pipelined requests tagged with an id, so commands for different
+        # instruments run in parallel even over a single connection.
+        self._connections = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
 
     # ---------------- Switch Functions ----------------
     def set_switch_voltage(self, device_name, channel, voltage):
@@ -45,26 +59,206 @@ class DeviceControllerServer:
         return json.loads(json_str)
 
     # --------------- Remote Functions -----------------
+    def _connection(self):
+        # Least-busy live connection, opening a new one while below pool_size
+        with self._lock:
+            self._connections = [c for c in self._connections if c.alive]
+            if len(self._connections) < self.pool_size:
+                conn = _MultiplexedConnection(self.host, self.port, self.timeout)
+                self._connections.append(conn)
+                return conn, False
+            return min(self._connections, key=lambda c: c.in_flight), True
+
+    def submit_cmd(self, cmd: str):
+        '''
+        Send an ASCII command without waiting for its response.
+        Returns a concurrent.futures.Future that resolves to the response
+        string. Any number of commands may be in flight on one connection;
+        the controller answers them in the order they finish.
+
+        A reused connection that turns out to be dead (e.g. the macbox
+        restarted) is replaced and the command sent again. A command that
+        was sent before the connection dropped is not retried, since it may
+        already have run.
+        '''
+        req_id = str(next(self._ids))
+        conn, reused = self._connection()
+        try:
+            return conn.request(req_id, cmd)
+        except ConnectionError as e:
+            if not reused:
+                raise
+            print(f"[Server] Reconnecting to controller: {e}")
+            conn, _ = self._connection()
+            return conn.request(req_id, cmd)
+
     def send_cmd(self, cmd: str):
         '''
         Send an ASCII command and wait for an ASCII response.
         Returns the response string.
         '''
-        with socket.socket() as s:
-            # avoid infinite wait
-            s.settimeout(2.0)
+        future = self.submit_cmd(cmd)
+        try:
+            response = future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise socket.timeout(f"No response to '{cmd}' within {self.timeout} s")
 
-            # connect socket
-            s.connect((self.host, self.port))
+        if response == "1":
+            raise ValueError(f"Command failed to send '{cmd}'")
 
-            # Send command
-            s.sendall((cmd + "\n").encode("ascii"))
+        return response
 
-            # Wait for response
-            response = s.recv(1024).decode("ascii").strip()
-            
-            if response == "1":
-                raise ValueError(f"Command failed to send '{cmd}'")
+    def subscribe(self, callback):
+        '''
+        Receive every reading batch the macbox publishes, as it is read.
+        callback(batch) runs on a background thread for each batch
+        {'time': unix time, 'readings': {device: {channel: value}}}.
+        The subscription reconnects by itself if the macbox restarts.
+        Returns the subscription; call its stop() to end it.
+        '''
+        subscription = _LiveSubscription(self.host, self.port, self.timeout, callback)
+        subscription.start()
+        return subscription
 
-        return response
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+class _MultiplexedConnection:
+    '''
+    One socket to the controller carrying many requests at once.
+    Requests are tagged "<id> <command>"; a reader thread matches each
+    "<id> <result>" reply to the Future of its request.
+    '''
+
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # The reader thread blocks until a reply or the connection closes
+        self.sock.settimeout(None)
+        self.alive = True
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def request(self, req_id, cmd):
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                raise ConnectionError("Controller connection is closed")
+            self._pending[req_id] = future
+        # Forget the request if the caller gives up on it
+        future.add_done_callback(lambda f: self._forget(req_id, f))
+        try:
+            with self._send_lock:
+                send_frame(self.sock, f"{req_id} {cmd}")
+        except OSError as e:
+            self._fail(e)
+            raise ConnectionError(f"Controller connection failed: {e}")
+        return future
+
+    def _forget(self, req_id, future):
+        with self._lock:
+            if self._pending.get(req_id) is future:
+                del self._pending[req_id]
+
+    def _read_loop(self):
+        try:
+            while True:
+                frame = recv_frame(self.sock)
+                if frame is None:
+                    raise ConnectionError("Controller closed the connection")
+                req_id, _, response = frame.partition(" ")
+                with self._lock:
+                    future = self._pending.pop(req_id, None)
+                if future is not None and not future.done():
+                    future.set_result(response.strip())
+        except OSError as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        with self._lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Controller connection lost: {error}"))
+        self.close()
+
+    def close(self):
+        self.alive = False
+        try:
+            # shutdown wakes the reader thread blocked in recv
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class _LiveSubscription(threading.Thread):
+    '''
+    Dedicated connection that streams reading batches from the controller.
+    '''
+
+    RETRY_INTERVAL = 2.0
+
+    def __init__(self, host, port, timeout, callback):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.callback = callback
+        self.sock = None
+        self._stop_event = threading.Event()
+
+    def _stream(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_frame(self.sock, "0 subscribe")
+        ack = recv_frame(self.sock)
+        if ack is None or ack.split(" ", 1)[-1].strip() != "0":
+            raise ConnectionError(f"Controller refused the subscription: {ack}")
+        # batches arrive whenever the macbox reads, so wait without a limit
+        self.sock.settimeout(None)
+        print("[Server] Subscribed to live readings")
+        while not self._stop_event.is_set():
+            frame = recv_frame(self.sock)
+            if frame is None:
+                raise ConnectionError("Controller closed the connection")
+            _, _, payload = frame.partition(" ")
+            try:
+                self.callback(json.loads(payload))
+            except Exception as e:
+                print("[Server] ERROR in live reading callback:", e)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._stream()
+            except (OSError, ValueError) as e:
+                if not self._stop_event.is_set():
+                    print(f"[Server] Live subscription lost, retrying: {e}")
+            finally:
+                if self.sock is not None:
+                    self.sock.close()
+            self._stop_event.wait(self.RETRY_INTERVAL)
 
+    def stop(self):
+        self._stop_event.set()
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -9,7 +9,10 @@ import numpy as np
 import itertools
 from CTC100 import CTC100Device
 from lakeshore224device import LakeShore224Device
-from lakeshore372device import LakeShore372Device
+from lakeshore372device import LakeShore372Device, LakeShore372Scanner
+from h5_writer import HDF5Writer
+from live_values import LiveValueStore
+from recipe import Recipe, Stage, RecipeScheduler, ResourcePool, do, below, settled, all_of
 try:
     from lakeshore.model_224 import Model224
     from lakeshore.model_372 import Model372
@@ -17,7 +20,6 @@ except ImportError:
     # If the lakeshore package is not installed, define None
     Model224 = None
     Model372 = None
-import h5py
 
 
 
@@ -68,129 +70,119 @@ import h5py
 
 
 class Data_Acquisition(Thread):
+    # Seconds before a failed cycle, or a stale device, is tried again; the
+    # delay doubles on every further failure up to MAX_RETRY_DELAY
+    RETRY_DELAY = 2.0
+    MAX_RETRY_DELAY = 60.0
+
     def __init__(self, data, filename, lock, start_aq=True):
         self.lock = lock
+        # LiveValueStore the cooldown routine reads current values from
         self.data_buffer = data
-        self.max_buffer = CHUNK
         self.start_acquisition = start_aq
         self.filename = filename
+        # stale device -> (monotonic time of its next read, delay after that)
+        self._backoff = {}
+
+        # shared data key -> dataset path in the HDF5 file
+        self.datasets = {'time': 'Time'}
+        for device in devices_list:
+            if device is model372:
+                for channel in device.output_channels:
+                    self.datasets[f'{device.name}/{channel}'] = f'{device.name}/{channel}_percentage'
+                for channel in device.input_channels:
+                    self.datasets[f'{device.name}/{channel}_sensor'] = f'{device.name}/{channel}_sensor'
+                    self.datasets[f'{device.name}/{channel}'] = f'{device.name}/{channel}_temperature'
+            else:
+                for channel in device.input_channels:
+                    self.datasets[f'{device.name}/{channel}'] = f'{device.name}/{channel}_temperature'
+
+        # The file stays open on the writer thread, which appends whole
+        # cycles in blocks; the queue holds at most H5_QUEUE cycles
+        self.writer = HDF5Writer(filename, 'a', {'/': list(self.datasets.values())},
+                                 max_queue=H5_QUEUE)
         super().__init__()
 
-    def run(self):
-        start_time = datetime.datetime.now().timestamp()
+    def acquire(self, start_time):
+        # one cycle of readings, taken while holding the serial lock; also
+        # returns the keys that only repeat an earlier reading
+        sample = {}
+        stale = set()
         with self.lock:
-            
-            current_time = datetime.datetime.now().timestamp() - start_time
-            self.data_buffer['time'].append(current_time)
-            if len(self.data_buffer['time']) > self.max_buffer:
-                with h5py.File(self.filename, 'a') as database:
-                    database['Time'][0:] = self.data_buffer['time']
-                self.data_buffer['time'] = []
-
+            sample['time'] = datetime.datetime.now().timestamp() - start_time
             for device in devices_list:
                 if device is model372:
-                    for channel in device.input_channels:
-                        # if channel == '9': 
-                        #     self.data_buffer[f'{device.name}/{channel}'].append(
-                        #     device.get_sensor(channel))
-                        #     if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                        #         with h5py.File(self.filename, 'a') as database:
-                        #             database[f'{device.name}/{channel}_sensor'][0:] = self.data_buffer[f'{device.name}/{channel}']
-                        #         self.data_buffer[f'{device.name}/{channel}'] = []
-                        # else:
-                        self.data_buffer[f'{device.name}/{channel}'].append(device.get_temperature(channel))
-                    if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                        with h5py.File(self.filename, 'a') as database:
-                            database[f'{device.name}/{channel}_temperature'][0:] = self.data_buffer[f'{device.name}/{channel}']
-                        self.data_buffer[f'{device.name}/{channel}'] = []
                     for channel in device.output_channels:
-                        self.data_buffer[f'{device.name}/{channel}'].append(
-                            device.get_output(channel))
-                        if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                            with h5py.File(self.filename, 'a') as database:
-                                database[f'{device.name}/{channel}_percentage'][0:] = self.data_buffer[f'{device.name}/{channel}']
-                            self.data_buffer[f'{device.name}/{channel}'] = []
+                        sample[f'{device.name}/{channel}'] = device.get_output(channel)
 
+                    # only the channel the scanner is parked on is fresh; the
+                    # others repeat their last reading until they are visited
+                    fresh = scanner372.step()
+                    for channel in device.input_channels:
+                        # the raw resistance comes with the same reading, at no extra query
+                        sample[f'{device.name}/{channel}_sensor'] = scanner372.latest_value(channel, np.nan, 'resistance')
+                        sample[f'{device.name}/{channel}'] = scanner372.latest_value(channel, np.nan)
+                        if str(channel) not in fresh:
+                            stale.update((f'{device.name}/{channel}_sensor', f'{device.name}/{channel}'))
                 else:
+                    readings = self.read_device(device)
                     for channel in device.input_channels:
-                        self.data_buffer[f'{device.name}/{channel}'].append(
-                            device.get_temperature(channel))
-                        if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                            with h5py.File(self.filename, 'a') as database:
-                                database[f'{device.name}/{channel}_temperature'][0:] = self.data_buffer[f'{device.name}/{channel}']
-                            self.data_buffer[f'{device.name}/{channel}'] = []
-                
-        
-        time.sleep(1)
-
-
-        
-        while self.start_acquisition:
-            with self.lock:
-                current_time = datetime.datetime.now().timestamp() - start_time
-                self.data_buffer['time'].append(current_time)
-                if len(self.data_buffer['time']) > self.max_buffer:
-                    with h5py.File(self.filename, 'a') as database:
-                        database['Time'].resize(
-                            (database['Time'].shape[0]+len(self.data_buffer['time'])), axis=0)
-                        database['Time'][-len(self.data_buffer['time']):] = self.data_buffer['time']
-                    self.data_buffer['time'] = []
-                for device in devices_list:
-                    if device is model372:
-                        for channel in device.output_channels:
-                            self.data_buffer[f'{device.name}/{channel}'].append(
-                                device.get_output(channel))
-                            if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                                with h5py.File(self.filename, 'a') as database:
-                                    database[f'{device.name}/{channel}_percentage'].resize(
-                                        (database[f'{device.name}/{channel}_percentage'].shape[0]+len(self.data_buffer[f'{device.name}/{channel}'])), axis=0)
-                                    database[f'{device.name}/{channel}_percentage'][-len(
-                                        self.data_buffer[f'{device.name}/{channel}']):] = self.data_buffer[f'{device.name}/{channel}']
-                                self.data_buffer[f'{device.name}/{channel}'] = []
-
-                        for channel in device.input_channels:
-                            # if channel == '9':
-                            #     self.data_buffer[f'{device.name}/{channel}'].append(
-                            #     device.get_sensor(channel))
-                            #     if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                            #         with h5py.File(self.filename, 'a') as database:
-                            #             database[f'{device.name}/{channel}_sensor'].resize(
-                            #                 (database[f'{device.name}/{channel}_sensor'].shape[0]+len(self.data_buffer[f'{device.name}/{channel}'])), axis=0)
-                            #             database[f'{device.name}/{channel}_sensor'][-len(
-                            #                 self.data_buffer[f'{device.name}/{channel}']):] = self.data_buffer[f'{device.name}/{channel}']
-                            #         self.data_buffer[f'{device.name}/{channel}'] = []       
-                            # else:
-                            self.data_buffer[f'{device.name}/{channel}'].append(
-                                device.get_temperature(channel))
-                            if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                                with h5py.File(self.filename, 'a') as database:
-                                    database[f'{device.name}/{channel}_temperature'].resize(
-                                        (database[f'{device.name}/{channel}_temperature'].shape[0]+len(self.data_buffer[f'{device.name}/{channel}'])), axis=0)
-                                    database[f'{device.name}/{channel}_temperature'][-len(self.data_buffer[f'{device.name}/{channel}']):] = self.data_buffer[f'{device.name}/{channel}']
-                                self.data_buffer[f'{device.name}/{channel}'] = []                                               
-                    else:        
-                        for channel in device.input_channels:
-                            self.data_buffer[f'{device.name}/{channel}'].append(
-                                device.get_temperature(channel))
-                            if len(self.data_buffer[f'{device.name}/{channel}']) > self.max_buffer:
-                                with h5py.File(self.filename, 'a') as database:
-                                    database[f'{device.name}/{channel}_temperature'].resize(
-                                        (database[f'{device.name}/{channel}_temperature'].shape[0]+len(self.data_buffer[f'{device.name}/{channel}'])), axis=0)
-                                    database[f'{device.name}/{channel}_temperature'][-len(
-                                        self.data_buffer[f'{device.name}/{channel}']):] = self.data_buffer[f'{device.name}/{channel}']
-                                self.data_buffer[f'{device.name}/{channel}'] = []
-                   
-
-
-
+                        value = readings.get(channel)
+                        sample[f'{device.name}/{channel}'] = np.nan if value is None else value
+        return sample, stale
+
+    def read_device(self, device):
+        # A device that stopped answering (CTC100.stale) is only retried
+        # with a growing delay, so it does not cost its timeout every cycle;
+        # meanwhile its channels are missing from the samples
+        now = time.monotonic()
+        retry_at, delay = self._backoff.get(device, (now, self.RETRY_DELAY))
+        if now < retry_at:
+            return {}
+        readings = device.read_all_channels()
+        if getattr(device, 'stale', False):
+            if device not in self._backoff:
+                print(f"[Data_Acquisition] {device.name} is not answering, retrying with backoff")
+            self._backoff[device] = (now + delay, min(2 * delay, self.MAX_RETRY_DELAY))
+        else:
+            self._backoff.pop(device, None)
+        return readings
 
-            
-            time.sleep(1)
+    def run(self):
+        start_time = datetime.datetime.now().timestamp()
+        self.writer.start()
+        delay = self.RETRY_DELAY
+        try:
+            while self.start_acquisition:
+                try:
+                    sample, stale = self.acquire(start_time)
+                except Exception as e:
+                    # a serial glitch must not end unattended control: the
+                    # recipes wait on these samples, so keep trying
+                    print(f"[Data_Acquisition] Cycle failed at {datetime.datetime.now()}, "
+                          f"retrying in {delay:.0f} s: {e}")
+                    time.sleep(delay)
+                    delay = min(2 * delay, self.MAX_RETRY_DELAY)
+                    continue
+                delay = self.RETRY_DELAY
+
+                # no file I/O under the serial lock: the cycle is published to
+                # the live store (held 372 values stay out of the trends) and
+                # handed to the writer
+                self.data_buffer.publish(sample['time'], sample, stale)
+                self.writer.append('/', {self.datasets[key]: value for key, value in sample.items()})
+
+                time.sleep(1)
+        finally:
+            self.writer.close()
             
 class Cooldown_routine(Thread):
-    def __init__(self, data, lock):
+    def __init__(self, data, lock, timing_log=None):
         self.data_buffer = data
         self.lock = lock
+        self.timing_log = timing_log
+        self.runners = {}
+        self.scheduler = None
         
         super().__init__()
     
@@ -235,7 +227,7 @@ class Cooldown_routine(Thread):
         # self.update_list_of_temperature(data_copy)
         # for system in [He7_B_channels, He7_A_channels]:
         #     print(f"checking {system['device'].name}")
-        #     while data_copy[f"LakeshoreModel372/{system['He4_head']}"][-1] > 4.0 and isfinished(data_copy['time'], data_copy[f"LakeshoreModel372/{system['He4_head']}"]):
+        #     while data_copy[f"LakeshoreModel372/{system['He4_head']}"][-1] > 4.0 and (self.data_buffer.slope(f"LakeshoreModel372/{system['He4_head']}") or 0) <= 0:
         #         time.sleep(1)
         #         self.update_list_of_temperature(data_copy)
         #     print(f"4He Heat switch on {system['device'].name}")
@@ -254,7 +246,7 @@ class Cooldown_routine(Thread):
         #     print(f"checking {system['device'].name} {system['He3_head']}")
         #     self.update_list_of_temperature(data_copy)
             
-        #     while data_copy[f"LakeshoreModel372/{system['He3_head']}"][-1] > 1.5 and isfinished(data_copy['time'], data_copy[f"LakeshoreModel372/{system['He3_head']}"]):
+        #     while data_copy[f"LakeshoreModel372/{system['He3_head']}"][-1] > 1.5 and (self.data_buffer.slope(f"LakeshoreModel372/{system['He3_head']}") or 0) <= 0:
         #         time.sleep(1)
         #         self.update_list_of_temperature(data_copy)
         #     print(f"Heater on {system['device'].name} {system['He3_head']}")
@@ -271,7 +263,7 @@ class Cooldown_routine(Thread):
 
         # for system in [He7_A_channels, He7_B_channels]:
         #     print('Aspettando l\'inverno')
-        #     while (condition_temperature := data_copy[f"LakeshoreModel372/{system['He3_head']}"][-1] > 0.45) and (condition_stability := isfinished(data_copy['time'], data_copy[f"LakeshoreModel372/{system['He3_head']}"] )):
+        #     while (condition_temperature := data_copy[f"LakeshoreModel372/{system['He3_head']}"][-1] > 0.45) and (condition_stability := (self.data_buffer.slope(f"LakeshoreModel372/{system['He3_head']}") or 0) <= 0):
         #         time.sleep(2)
         #         self.update_list_of_temperature(data_copy)
 
@@ -287,6 +279,16 @@ class Cooldown_routine(Thread):
         list_of_systems = {'System A': [
             He7_A_channels, True], 'System_B': [He7_B_channels, False]}
 
+        # compile the recipe for both systems now, so a missing channel or
+        # parameter shows up before anything is switched. The systems share
+        # the 'regeneration' resource, so only one regenerates at a time; the
+        # one flagged True is added first and regenerates first.
+        self.scheduler = RecipeScheduler(ResourcePool(['regeneration']))
+        for system, status in sorted(list_of_systems.values(), key=lambda v: not v[1]):
+            self.runners[system['device'].name] = self.scheduler.add(
+                CRYO_COOL, system, self.data_buffer, RECIPE_ACTIONS, recipe_channel,
+                lock=self.lock, name=system['device'].name, log_path=self.timing_log)
+
         '''Cycling with load curve'''
         
         # Still_voltages = [65, 70, 30]
@@ -308,97 +310,21 @@ class Cooldown_routine(Thread):
         # except:
         #     pass
 
-        '''setting the still and just cycle forever'''
+        '''setting the still and just cycle forever, both systems at once'''
 
         # model372.set_still_voltage(65)
-        while True:
-            for key, values in list_of_systems.items():
-                system, status = values
-                if status:
-                    status_update = self.cryo_cool(system)
-                    list_of_systems[key][1] = status_update
-                else:
-                    list_of_systems[key][1] = True
+        self.scheduler.start()
+        self.scheduler.join()
 
-    def update_list_of_temperature(self, data_list):
-        for key in self.data_buffer:
-            data_list[key].extend(self.data_buffer[key])
-        
     def cryo_cool(self, system):
-        print(f"Switching off Heat switches on {system['device'].name}")
-        with self.lock:
-
-            switch_off(system['device'], system['He4_aio'])
-            switch_off(system['device'], system['He3_aio'])
-            
-        data_copy = self.data_buffer.copy()
-        print(f"checking {system['device'].name} waiting for switches to cool down below 10K")
-        time.sleep(10)
-        self.update_list_of_temperature(data_copy)
-
-        while data_copy[f"{system['device'].name}/{system['He4_switch']}"][-1] > 10 or data_copy[f"{system['device'].name}/{system['He3_switch']}"][-1] > 10:
-            time.sleep(2)
-            self.update_list_of_temperature(data_copy)
-        print(f"Heater on {system['device'].name}, waiting for 4He head to reach 3 K")
-
-        with self.lock:
-
-
-            heater_on(system['device'], system['He4_heater'])
-            heater_on(system['device'], system['He3_heater'])
-
-
-        print(f'sleeping 10 minutes, startint at {datetime.datetime.now()}')
-
-        time.sleep(1800)
-        print('waking up, startint to check')
-        
-            
-        self.update_list_of_temperature(data_copy)
-
-        while data_copy[f"LakeshoreModel372/{system['He4_head']}"][-1] > 3.1: #and isfinished(data_copy['time'], data_copy[f"LakeshoreModel372/{system['He4_head']}"]):
-            time.sleep(2)
-            self.update_list_of_temperature(data_copy)
-        
-        print(f"Heat switch on {system['device'].name}, waiting for 3He to reach 1.2 K")
-
-        with self.lock:
-
-            heater_off(system['device'], system['He4_heater'])
-            switch_on(system['device'], system['He4_aio'])
-            
-        print(f'sleeping 10 minutes, startint at {datetime.datetime.now()}')
-        time.sleep(600)
-        print('waking up, startint to check')
-        self.update_list_of_temperature(data_copy)
-        time.sleep(20)
-
-        self.update_list_of_temperature(data_copy)
-
-        while data_copy[f"LakeshoreModel372/{system['He3_head']}"][-1] > 1.2: #and isfinished(data_copy['time'], data_copy[f"LakeshoreModel372/{system['He3_head']}"]):
-            time.sleep(2)
-            self.update_list_of_temperature(data_copy)
-
-
-        print(f"Heat switch on on {system['device'].name}, waiting for 3He to reaching <450mK")
-        with self.lock:
-
-            heater_off(system['device'], system['He3_heater'])
-            switch_on(system['device'], system['He3_aio'])
-            
-        print(f'sleeping 5 min starting at {datetime.datetime.now()}')
-        time.sleep(300)
-        self.update_list_of_temperature(data_copy)
-
-        print('waking again, startint to check')
-        while (condition_temperature := data_copy[f"LakeshoreModel372/{system['He3_head']}"][-1] > 0.450): #and (condition_stability := isfinished(data_copy['time'], data_copy[f"LakeshoreModel372/{system['He3_head']}"] )):
-            time.sleep(2)
-            self.update_list_of_temperature(data_copy)
-
-        if not condition_temperature:
-            print(f'walrus activated, sleeping 10 minutes starting at {datetime.datetime.now()}')
-            time.sleep(600)
+        # one cycle of the CRYO_COOL recipe, run here instead of by the
+        # scheduler; each stage waits on the live values and its duration
+        # is kept in the runner's timings
+        runner = self.runners[system['device'].name]
+        runner.run_cycle()
         print('Ready to switch system')
+        for stage, stats in runner.stage_summary().items():
+            print(f"  {stage}: mean {stats['mean']:.0f} s over {stats['count']} cycles, {stats['timeouts']} timeouts")
 
         return False
 
@@ -406,8 +332,8 @@ class Cooldown_routine(Thread):
     
             
 def switch_on(device, channel, voltage):
+    # IOType is cached on the device, so this only costs the voltage write
     IOtype_check = device.get_aio_iotype(channel)
-    voltage_check = device.get_aio_voltage(channel)
     if IOtype_check == 'Set out':
         device.set_aio_voltage(channel, voltage)
     else:
@@ -446,18 +372,66 @@ def heater_off(device, channel):
     device.disable_PID(channel)
     device.set_heater_output(channel, 0)
 
-def isfinished(time_buffer, temperature_buffer):
-    try:
-        Y = temperature_buffer[-1] - temperature_buffer[-20]
-        X = time_buffer[-1] - time_buffer[-20]
-        # X = X.total_seconds()
-        slope = Y/X
-        if slope > 0:
-            return False
-        else:
-            return True
-    except:
-        return True
+def recipe_channel(system, name):
+    # heads are read by the 372, everything else by the system's CTC100
+    device = model372 if name.endswith('_head') else system['device']
+    return f"{device.name}/{system[name]}"
+
+
+RECIPE_ACTIONS = {
+    'switch_on': lambda system, channel, voltage: switch_on(system['device'], channel, voltage),
+    'switch_off': lambda system, channel: switch_off(system['device'], channel),
+    'heater_on': lambda system, channel: heater_on(system['device'], channel),
+    'heater_off': lambda system, channel: heater_off(system['device'], channel),
+}
+
+# Minimum time each heating stage lasts, in seconds. These are the fixed
+# soaks of the original routine: the pumps are heated (or the switches kept
+# on) at least this long before the head temperature is allowed to end the
+# stage. Nothing shows that the head readings alone mean the pumps have
+# desorbed, so the soaks are kept and only the waits after them follow the
+# live values.
+PUMP_SOAK = 1800
+HE4_SWITCH_SOAK = 600
+HE3_SWITCH_SOAK = 300
+# The 3He head counts as settled once its trend is flatter than this (K/min)
+HE3_SETTLED_RATE = 0.005
+# Trend time constant of the shared live values in seconds: the scanner
+# visits each 372 channel only once per sweep of its sequence (about 40 s),
+# so the slopes need a few minutes of samples
+LIVE_TREND_TIME = 300
+
+# The cycle of one 7He system. Each stage advances as soon as its soak is
+# over and its head is below the threshold.
+# A system holds 'regeneration' from opening its switches until its 3He head
+# is below 450 mK again, so the 3He heads never regenerate together and one
+# system keeps cooling while the other regenerates. The other system's
+# switches cool down while this one's 3He head settles.
+# If an action fails, both pump heaters and both switch heaters are turned
+# off (safe_state) and that system's runner stops.
+CRYO_COOL = Recipe('cryo_cool', [
+    Stage('switches cooling',
+          actions=[do('switch_off', 'He4_aio'), do('switch_off', 'He3_aio')],
+          until=below(['He4_switch', 'He3_switch'], 10), acquire=['regeneration']),
+    Stage('4He pump heating',
+          actions=[do('heater_on', 'He4_heater'), do('heater_on', 'He3_heater')],
+          until=below('He4_head', 3.1), min_time=PUMP_SOAK),
+    Stage('4He switch on',
+          actions=[do('heater_off', 'He4_heater'), do('switch_on', 'He4_aio', 'switch_voltage')],
+          until=below('He3_head', 1.2), min_time=HE4_SWITCH_SOAK),
+    Stage('3He switch on',
+          actions=[do('heater_off', 'He3_heater'), do('switch_on', 'He3_aio', 'switch_voltage')],
+          until=below('He3_head', 0.450), min_time=HE3_SWITCH_SOAK, release=['regeneration']),
+    # ready once the 3He head has stayed below 450 mK, and stopped drifting,
+    # for 10 minutes
+    Stage('3He head settling',
+          until=all_of(below('He3_head', 0.450), settled('He3_head', HE3_SETTLED_RATE)), dwell=600),
+], repeat=True, safe_state=[
+    do('heater_off', 'He4_heater'), do('heater_off', 'He3_heater'),
+    do('switch_off', 'He4_aio'), do('switch_off', 'He3_aio'),
+])
+
+
     
     
 
@@ -495,13 +469,20 @@ if __name__== "__main__":
     devices_list = [ctc100B, ctc100A, model224, model372]
 
     '''If you change the mapping of the channels you have to change these lists to!'''
+    # Heat switch heater voltage used by the recipes: set it for your switches, the cycle will not start without it
+    SWITCH_VOLTAGE = None
 
     He7_B_channels = {'device': ctc100B, 'He4_head': model372.input_channels[1], 'He3_head': model372.input_channels[0], 'He4_pump': ctc100B.input_channels[2], 'He3_pump': ctc100B.input_channels[3], 'He4_switch': ctc100B.input_channels[
-        0], 'He3_switch': ctc100B.input_channels[1], 'He4_heater': ctc100B.output_channels[0], 'He3_heater': ctc100B.output_channels[1], 'He4_aio': ctc100B.aio_channels[0], 'He3_aio': ctc100B.aio_channels[1]}
+        0], 'He3_switch': ctc100B.input_channels[1], 'He4_heater': ctc100B.output_channels[0], 'He3_heater': ctc100B.output_channels[1], 'He4_aio': ctc100B.aio_channels[0], 'He3_aio': ctc100B.aio_channels[1], 'switch_voltage': SWITCH_VOLTAGE}
     He7_A_channels = {'device': ctc100A, 'He4_head': model372.input_channels[3], 'He3_head': model372.input_channels[2], 'He4_pump': ctc100A.input_channels[2], 'He3_pump': ctc100A.input_channels[3], 'He4_switch': ctc100A.input_channels[
-        0], 'He3_switch': ctc100A.input_channels[1], 'He4_heater': ctc100A.output_channels[0], 'He3_heater': ctc100A.output_channels[1], 'He4_aio': ctc100A.aio_channels[0], 'He3_aio': ctc100A.aio_channels[1]}
+        0], 'He3_switch': ctc100A.input_channels[1], 'He4_heater': ctc100A.output_channels[0], 'He3_heater': ctc100A.output_channels[1], 'He4_aio': ctc100A.aio_channels[0], 'He3_aio': ctc100A.aio_channels[1], 'switch_voltage': SWITCH_VOLTAGE}
     Dilution_refrigerator = {'Mixing_Chamber_SC': model372.input_channels[5], 'Mixing_Chamber_31206': model372.input_channels[8], 'Still': model372.input_channels[4], 'Split_Condenser': model372.input_channels[7]}
 
+    '''The 372 only measures the channel its scanner is parked on: the heads and the DR thermometers are visited in turn.
+    An entry can also be (channel, dwell, settle) to change the time spent on it.'''
+    scan_sequence = [He7_A_channels['He4_head'], He7_A_channels['He3_head'], He7_B_channels['He4_head'], He7_B_channels['He3_head']] + list(Dilution_refrigerator.values())
+    scanner372 = LakeShore372Scanner(model372, scan_sequence)
+
 
     # Initialise the databases folder
     database_dir = './DATA'
@@ -510,51 +491,16 @@ if __name__== "__main__":
 
 
     # Initialise the database in hdf5
-    CHUNK = 1
+    # Cycles queued for the HDF5 writer before the acquisition waits for it
+    H5_QUEUE = 600
     today = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    shared_data = {}
+    # latest values and recent history shared with the cooldown routine
+    shared_data = LiveValueStore(trend_time=LIVE_TREND_TIME)
     filename = f'{database_dir}/{today}_cooldown.hdf5'
-    try:
-        with h5py.File(f'{filename}', 'w-', libver='latest') as database:
-            database.create_dataset('Time', shape=(
-                CHUNK), chunks=True, maxshape=(None,))
-
-            shared_data['time'] = []
-            for device in devices_list:
-                if device is model372:
-                    tmp = database.create_group(f'{device.name}')
-
-                    for channel in device.output_channels:
-                        tmp.create_dataset(f'{channel}_percentage', shape=(
-                            CHUNK), chunks=True, maxshape=(None,))
-                        shared_data[f'{device.name}/{channel}'] = []
-                    for channel in device.input_channels:
-                        # if channel == '9':
-                        #     tmp.create_dataset(f'{channel}_sensor', shape=(
-                        #     CHUNK), chunks=True, maxshape=(None,))
-                        #     shared_data[f'{device.name}/{channel}'] = []
-                        # else:
-                        tmp.create_dataset(f'{channel}_temperature', shape=(
-                        CHUNK), chunks=True, maxshape=(None,))
-
-                        shared_data[f'{device.name}/{channel}'] = []
-                
-                else:
-                    tmp = database.create_group(f'{device.name}')
-                    for channel in device.input_channels:
-                        tmp.create_dataset(f'{channel}_temperature', shape=(
-                            CHUNK), chunks=True, maxshape=(None,))
-                    
-                        shared_data[f'{device.name}/{channel}'] = []
-
-    except:
+    # The datasets are created by the acquisition's HDF5 writer
+    if os.path.exists(filename):
         print(
             f'File {filename} already exists. Adding data to the existing file')
-        # with h5py.File(f'{today}_cooldown.hdf5', 'a', libver='latest') as database:
-        shared_data['time'] = []
-        for device in devices_list:
-            for channel in device.input_channels:
-                shared_data[f'{device.name}/{channel}'] = []
 
     # database.swmr_mode = True
 
@@ -562,7 +508,7 @@ if __name__== "__main__":
     serial_lock = Lock()
     
     data = Data_Acquisition(shared_data, filename,  lock = serial_lock, start_aq=True)
-    cooldown = Cooldown_routine(shared_data, lock = serial_lock)
+    cooldown = Cooldown_routine(shared_data, lock = serial_lock, timing_log = f'{database_dir}/{today}_stages.csv')
     
 
     print('starting')
@@ -0,0 +1,67 @@
+# framing.py
+# Length-prefixed messages for the controller socket: a 4-byte big-endian
+# payload length followed by the ASCII payload.
+import asyncio
+import struct
+
+HEADER = struct.Struct(">I")
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def encode_frame(text: str) -> bytes:
+    payload = text.encode("ascii")
+    return HEADER.pack(len(payload)) + payload
+
+
+def send_frame(sock, text: str):
+    sock.sendall(encode_frame(text))
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_frame(sock):
+    '''
+    Read one frame from a blocking socket.
+    Returns the payload string, or None if the peer closed the connection
+    before a new frame started.
+    '''
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ConnectionError(f"Frame of {size} bytes exceeds limit")
+    payload = _recv_exactly(sock, size)
+    if payload is None:
+        raise ConnectionError("Connection closed in the middle of a frame")
+    return payload.decode("ascii")
+
+
+async def read_frame(reader):
+    '''
+    Read one frame from an asyncio StreamReader.
+    Returns the payload string, or None if the peer closed the connection
+    before a new frame started.
+    '''
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ConnectionError("Connection closed in the middle of a frame")
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ConnectionError(f"Frame of {size} bytes exceeds limit")
+    try:
+        payload = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Connection closed in the middle of a frame")
+    return payload.decode("ascii")
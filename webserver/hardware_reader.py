@@ -1,12 +1,132 @@
 # hardware_reader.py
 import time
+import threading
 import serial
 import numpy as np
 import serial.tools.list_ports
 
 from CTC100 import CTC100Device
 from lakeshore224device import LakeShore224Device
-from lakeshore372device import LakeShore372Device
+from lakeshore372device import LakeShore372Device, LakeShore372Scanner
+from worker import get_worker, READOUT
+
+
+# -------------------- Channel mapping --------------------
+# logical channel name -> instrument channel
+CTC100_CHANNELS = ["4switch", "4pump", "3switch", "3pump"]
+
+LAKESHORE224_CHANNELS = {
+    "4HePotA": "C1",
+    "3HePotA": "B",
+    "4HePotB": "C2",
+    "3HePotB": "D1",
+    "Condenser": "A",
+    "50K Plate": "D2",
+    "4K Plate": "D3",
+}
+
+LAKESHORE372_CHANNELS = {
+    "MC":    "1",
+    "Still": "A",
+}
+
+# Raw sensor resistance of each scanned 372 channel, logged under its own
+# slow-control name and kept out of the temperature readings
+RESISTANCE_NAMES = {name: f"{name} [Ohm]" for name, ch in LAKESHORE372_CHANNELS.items() if ch != "A"}
+
+DEVICE_CHANNELS = {
+    "CTC100A": [ch + "A" for ch in CTC100_CHANNELS],
+    "CTC100B": [ch + "B" for ch in CTC100_CHANNELS],
+    "Lakeshore224": list(LAKESHORE224_CHANNELS),
+    "Lakeshore372": list(LAKESHORE372_CHANNELS),
+}
+
+
+# -------------------- Per-device readout --------------------
+# Each of these runs on the device's own I/O worker thread. `channels` is the
+# set of logical channels wanted (None for all); bulk reads return everything.
+
+def read_ctc100(dev, suffix, channels=None):
+    snapshot = dev.read_snapshot()
+    return {ch + suffix: snapshot.get(ch) for ch in CTC100_CHANNELS}
+
+
+def read_lakeshore224(dev, channels=None):
+    # all channels come back from one query, so return every one of them
+    snapshot = dev.read_snapshot()
+    return {name: snapshot.get(ch) for name, ch in LAKESHORE224_CHANNELS.items()}
+
+
+# one scanner per LakeShore 372, created on first read
+_scanners = {}
+# newest resistance per RESISTANCE_NAMES entry, until take_resistances()
+_resistances = {}
+_resistances_lock = threading.Lock()
+
+
+def take_resistances():
+    """
+    :return: Dictionary {resistance name: ohms} of the 372 readings taken
+             since the last call; the temperature readings never contain these.
+    """
+    with _resistances_lock:
+        resistances = dict(_resistances)
+        _resistances.clear()
+    return resistances
+
+
+def read_lakeshore372(dev, channels=None):
+    # The scanner parks on the scanned channels in turn and only hands back
+    # settled readings; the control input is read every time.
+    scanner = _scanners.get(dev)
+    if scanner is None:
+        sequence = [ch for ch in LAKESHORE372_CHANNELS.values() if ch != "A"]
+        scanner = _scanners[dev] = LakeShore372Scanner(dev, sequence)
+    fresh = scanner.step()
+    readings = {}
+    for name, ch in LAKESHORE372_CHANNELS.items():
+        if ch in fresh:
+            readings[name] = fresh[ch]["kelvin"]
+            if name in RESISTANCE_NAMES:
+                # each record carries both values, so the raw resistance is free
+                with _resistances_lock:
+                    _resistances[RESISTANCE_NAMES[name]] = fresh[ch]["resistance"]
+    return readings
+
+
+DEVICE_READERS = {
+    "CTC100A": lambda dev, channels=None: read_ctc100(dev, "A", channels),
+    "CTC100B": lambda dev, channels=None: read_ctc100(dev, "B", channels),
+    "Lakeshore224": read_lakeshore224,
+    "Lakeshore372": read_lakeshore372,
+}
+
+
+def read_devices_parallel(devices, channels=None):
+    """
+    Read every known device on its own I/O worker at the same time.
+
+    A cycle therefore takes as long as the slowest instrument, not the sum.
+    If `channels` is given, devices without a wanted channel are skipped.
+    Returns {device name: {channel name: value}}.
+    """
+    futures = {}
+    for dev_name, read in DEVICE_READERS.items():
+        if dev_name not in devices:
+            continue
+        if channels is not None and not channels.intersection(DEVICE_CHANNELS[dev_name]):
+            continue
+        futures[dev_name] = get_worker(devices[dev_name]).submit(
+            read, devices[dev_name], channels, priority=READOUT)
+
+    readings = {}
+    for dev_name, future in futures.items():
+        try:
+            readings[dev_name] = future.result()
+        except Exception as e:
+            print(f"Error reading {dev_name}: {e}")
+    return readings
+
 
 class HardwareTemperatureReader:
     """
@@ -17,50 +137,6 @@ class HardwareTemperatureReader:
     def __init__(self, devices):
         self.devices = devices
 
-    def read_temperatures(self):
-        d = self.devices
-        readings = {}
-
-        # -------------------- CTC100A --------------------
-        if "CTC100A" in d:
-            dev = d["CTC100A"]
-            readings["CTC100A"] = {
-                "4switchA": dev.get_temperature("4switch"),
-                "4pumpA":   dev.get_temperature("4pump"),
-                "3switchA": dev.get_temperature("3switch"),
-                "3pumpA":   dev.get_temperature("3pump"),
-            }
-
-        # -------------------- CTC100B --------------------
-        if "CTC100B" in d:
-            dev = d["CTC100B"]
-            readings["CTC100B"] = {
-                "4switchB": dev.get_temperature("4switch"),
-                "4pumpB":   dev.get_temperature("4pump"),
-                "3switchB": dev.get_temperature("3switch"),
-                "3pumpB":   dev.get_temperature("3pump"),
-            }
-
-        # -------------------- LakeShore 224 --------------------
-        if "Lakeshore224" in d:
-            dev = d["Lakeshore224"]
-            readings["Lakeshore224"] = {
-                "4HePotA": dev.get_temperature("C1"),
-                "3HePotA": dev.get_temperature("B"),
-                "4HePotB": dev.get_temperature("C2"),
-                "3HePotB": dev.get_temperature("D1"),
-                "Condenser": dev.get_temperature("A"),
-                "50K Plate": dev.get_temperature("D2"),
-                "4K Plate": dev.get_temperature("D3"),
-            }
-
-        # -------------------- LakeShore 372 --------------------
-        if "Lakeshore372" in d:
-            dev = d["Lakeshore372"]
-            readings["Lakeshore372"] = {
-                "MC":    dev.get_temperature("1"),
-                "Still": dev.get_temperature("A"),
-            }
-
-        return readings
+    def read_temperatures(self, channels=None):
+        return read_devices_parallel(self.devices, channels)
 
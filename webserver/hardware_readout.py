@@ -11,7 +11,16 @@ from lakeshore372device import LakeShore372Device
 
 from SQL import SQL 
 
-from controller import hardware_lock
+from hardware_reader import read_devices_parallel, take_resistances, DEVICE_CHANNELS, RESISTANCE_NAMES
+from poll_scheduler import AdaptivePollScheduler
+
+# Readings are buffered and written in one transaction once either limit is hit
+FLUSH_INTERVAL = 10.0    # seconds
+FLUSH_ROWS = 500
+# Rows kept while the database is unreachable; the oldest are dropped beyond this
+MAX_BUFFERED_ROWS = 100000
+# Seconds between insert throughput reports
+REPORT_INTERVAL = 300.0
 
 class HardwareTemperatureReader(threading.Thread):
     """
@@ -19,62 +28,38 @@ class HardwareTemperatureReader(threading.Thread):
     Only reads temperatures and returns a unified reading dict.
     """
 
-    def __init__(self, devices, sql: SQL):
+    def __init__(self, devices, sql: SQL, broadcaster=None):
         super().__init__(daemon=True)
         self.devices = devices
         self.sql = sql
-        self.interval = 2.0
+        # Live subscribers get each batch as soon as it is read
+        self.broadcaster = broadcaster
+        # Rows (name, value, timestamp) waiting for the next bulk insert
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._stats = {"rows": 0, "flushes": 0, "seconds": 0.0}
+        self._last_report = time.monotonic()
+        # Each channel is polled at a rate set by how fast it is changing
+        self.scheduler = AdaptivePollScheduler(
+            ch for dev_name in devices for ch in DEVICE_CHANNELS.get(dev_name, []))
         self._stop_event = threading.Event()
 
-    def read_temperatures(self):
-        d = self.devices
-        readings = {}
-
-        with hardware_lock:
-            # -------------------- CTC100A --------------------
-            if "CTC100A" in d:
-                dev = d["CTC100A"]
-                readings["CTC100A"] = {
-                    "4switchA": dev.get_temperature("4switch"),
-                    "4pumpA":   dev.get_temperature("4pump"),
-                    "3switchA": dev.get_temperature("3switch"),
-                    "3pumpA":   dev.get_temperature("3pump"),
-                }
-
-            # -------------------- CTC100B --------------------
-            if "CTC100B" in d:
-                dev = d["CTC100B"]
-                readings["CTC100B"] = {
-                    "4switchB": dev.get_temperature("4switch"),
-                    "4pumpB":   dev.get_temperature("4pump"),
-                    "3switchB": dev.get_temperature("3switch"),
-                    "3pumpB":   dev.get_temperature("3pump"),
-                }
-
-            # -------------------- LakeShore 224 --------------------
-            if "Lakeshore224" in d:
-                dev = d["Lakeshore224"]
-                readings["Lakeshore224"] = {
-                    "4HePotA": dev.get_temperature("C1"),
-                    "3HePotA": dev.get_temperature("B"),
-                    "4HePotB": dev.get_temperature("C2"),
-                    "3HePotB": dev.get_temperature("D1"),
-                    "Condenser": dev.get_temperature("A"),
-                    "50K Plate": dev.get_temperature("D2"),
-                    "4K Plate": dev.get_temperature("D3"),
-                }
-
-            # -------------------- LakeShore 372 --------------------
-            if "Lakeshore372" in d:
-                dev = d["Lakeshore372"]
-                readings["Lakeshore372"] = {
-                    "MC":    dev.get_temperature("1"),
-                    "Still": dev.get_temperature("A"),
-                }
-
-        return readings
-
-    def write_temperatures_to_db(self, readings):
+    def read_temperatures(self, channels=None):
+        # Each instrument is read in parallel on its own I/O worker
+        return read_devices_parallel(self.devices, channels)
+
+    def register_resistances(self):
+        # The resistance series are new slow-control items; they are created
+        # here on purpose, since inserts never register unknown names
+        try:
+            self.sql.getSCIDs(list(RESISTANCE_NAMES.values()), register=True)
+        except Exception as e:
+            print("[HardwareReadoutThread] ERROR registering resistance channels:", e)
+
+    def write_temperatures_to_db(self, readings, resistances=None):
+        # Buffer the cycle; the rows are written in bulk by flush_to_db.
+        # Only the channels read in this cycle are written: readers pivot by
+        # timestamp and get NaN where a channel has no sample.
         timestamp = datetime.now()
 
         for device, channel_dict in readings.items():
@@ -87,22 +72,78 @@ class HardwareTemperatureReader(threading.Thread):
                     print(f"Skipping invalid value for {name}: {value}")
                     continue
 
-                self.sql.insertSCValueByName(name, value, timestamp)
+                self._rows.append((name, value, timestamp))
+
+        # resistances are a separate series and only logged when measured
+        for name, value in (resistances or {}).items():
+            try:
+                self._rows.append((name, float(value), timestamp))
+            except (TypeError, ValueError):
+                pass
+
+        if (len(self._rows) >= FLUSH_ROWS
+                or time.monotonic() - self._last_flush >= FLUSH_INTERVAL):
+            self.flush_to_db()
+
+    def flush_to_db(self):
+        """
+        Write all buffered rows in one transaction.
+        If the insert fails the rows stay buffered for the next attempt;
+        rows of channels that are not slow control items are dropped.
+        """
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+        start = time.perf_counter()
+        written = self.sql.insertSCRowsByName(self._rows)
+        elapsed = time.perf_counter() - start
+
+        if written >= 0:
+            # written, or nothing insertable (unknown names, reported by SQL)
+            self._rows = []
+            if written:
+                self._stats["rows"] += written
+                self._stats["flushes"] += 1
+                self._stats["seconds"] += elapsed
+        elif len(self._rows) > MAX_BUFFERED_ROWS:
+            print(f"[HardwareReadoutThread] Dropping {len(self._rows) - MAX_BUFFERED_ROWS} unwritten rows")
+            self._rows = self._rows[-MAX_BUFFERED_ROWS:]
+
+        if time.monotonic() - self._last_report >= REPORT_INTERVAL:
+            self.report_insert_rate()
+
+    def report_insert_rate(self):
+        stats = self._stats
+        if stats["seconds"] > 0:
+            print(f"[HardwareReadoutThread] {stats['rows']} rows in {stats['flushes']} inserts, "
+                  f"{stats['rows'] / stats['seconds']:.0f} rows/s")
+        self._stats = {"rows": 0, "flushes": 0, "seconds": 0.0}
+        self._last_report = time.monotonic()
 
     def stop(self):
         self._stop_event.set()
 
     def run(self):
         print("[HardwareReadoutThread] Starting background temperature logging...")
+        self.register_resistances()
 
         while not self._stop_event.is_set():
             try:
-                readings = self.read_temperatures()
-                self.write_temperatures_to_db(readings)
+                due = self.scheduler.due()
+                if due:
+                    readings = self.read_temperatures(due)
+                    self.scheduler.record_readings(readings, due)
+                    if self.broadcaster is not None:
+                        self.broadcaster.publish(readings)
+                    self.write_temperatures_to_db(readings, take_resistances())
             except Exception as e:
                 print("[HardwareReadoutThread] ERROR during read/write:", e)
 
-            # Sleep with interrupt support
-            self._stop_event.wait(self.interval)
+            # Sleep until the next channel is due, with interrupt support
+            self._stop_event.wait(max(self.scheduler.time_until_next(), 0.05))
 
+        try:
+            self.flush_to_db()
+        except Exception as e:
+            print("[HardwareReadoutThread] ERROR during final write:", e)
         print("[HardwareReadoutThread] Stopped.")
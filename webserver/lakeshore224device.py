@@ -39,11 +39,28 @@ class LakeShore224Device:
             return None
 
     def read_all_channels(self):
-        readings = {}
-        for channel in self.input_channels:
-            temp = self.get_temperature(channel)
-            readings[channel] = temp
-        return readings
+        return self.read_snapshot()
+
+    def read_snapshot(self):
+        """
+        Read the Kelvin temperature of every input channel in one exchange.
+
+        'KRDG? 0' returns all readings as a comma separated list in the order
+        A, B, C1 - C5, D1 - D5, the same order as self.input_channels.
+
+        :return: Dictionary with channel names as keys and temperatures as values
+                 (None for every channel if the read failed).
+        """
+        try:
+            response = self.device.query("KRDG? 0")
+            values = [float(value) for value in response.split(',')]
+            if len(values) != len(self.input_channels):
+                raise RuntimeError(
+                    f"Expected {len(self.input_channels)} readings, got {len(values)}")
+            return dict(zip(self.input_channels, values))
+        except Exception as e:
+            print(f"Error reading all channels from Lake Shore 224: {e}")
+            return {channel: None for channel in self.input_channels}
 
     def list_channels(self):
         """
@@ -0,0 +1,190 @@
+# live_store.py
+# Shared, versioned store of the live plot data.
+import bisect
+import threading
+from collections.abc import Sequence
+
+from trend import TrendEstimator
+
+# Samples kept per device (a day at one sample per second); older ones are
+# dropped in blocks of TRIM_BLOCK so the copy is rare
+MAX_SAMPLES = 86400
+TRIM_BLOCK = 4096
+
+
+def _seconds(t):
+    # sample times are unix seconds, or datetimes when they come from the DB
+    return t.timestamp() if hasattr(t, "timestamp") else float(t)
+
+
+class SeriesView(Sequence):
+    """
+    Read-only view of the first `length` samples of a stored series.
+
+    The store only appends to its lists, and trimming replaces a list rather
+    than changing it, so the samples a view covers never change and the view
+    needs no copy of them.
+    """
+
+    __slots__ = ("_values", "_length")
+
+    def __init__(self, values, length):
+        self._values = values
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._values[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("SeriesView index out of range")
+        return self._values[index]
+
+    def tolist(self):
+        return self._values[:self._length]
+
+
+class LiveDataStore:
+    """
+    Time series for every plotted device, shared between the thread that
+    receives readings and the Flask request threads.
+
+    The layout is the same as remote_readout.plot_data:
+    {device: {"times": [...], channel: [...]}}. Each append bumps a global
+    version number, so a reader can ask for a view of the current data or
+    for only what was added since the version it last saw. Every device also
+    has a TrendEstimator fed with its samples, for the current slopes.
+
+    Each device keeps its newest max_samples samples; the version index is
+    pruned along with them, and a reader further behind than that gets
+    everything still kept.
+    """
+
+    def __init__(self, layout, max_samples=MAX_SAMPLES):
+        """
+        :param layout: Dictionary {device: iterable of series names}, "times" included.
+        :param max_samples: Samples kept per device.
+        """
+        self.max_samples = max_samples
+        self._series = {dev: {name: [] for name in names} for dev, names in layout.items()}
+        # per device: versions at which it was appended to, and its total
+        # length (dropped samples included) after each
+        self._versions = {dev: [] for dev in self._series}
+        self._lengths = {dev: [] for dev in self._series}
+        # per device: samples dropped from the front so far
+        self._trimmed = {dev: 0 for dev in self._series}
+        self._trends = {dev: TrendEstimator(name for name in series if name != "times")
+                        for dev, series in self._series.items()}
+        self._version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def version(self):
+        return self._version
+
+    def devices(self):
+        return list(self._series)
+
+    def append(self, device, times, columns, stale=()):
+        """
+        Append samples to one device.
+
+        :param device: Device name.
+        :param times: List of sample times.
+        :param columns: Dictionary {channel: list of values, one per time}.
+                        Channels not given are padded with NaN.
+        :param stale: Channels whose values repeat an earlier reading; they
+                      are stored but left out of the trend.
+        :return: The new version number.
+        """
+        if not times:
+            return self._version
+        with self._changed:
+            series = self._series[device]
+            for name, values in series.items():
+                if name == "times":
+                    values.extend(times)
+                else:
+                    new = columns.get(name)
+                    values.extend(new if new is not None else [float("nan")] * len(times))
+            trend = self._trends[device]
+            for k, t in enumerate(times):
+                trend.update(_seconds(t), {name: values[k] for name, values in columns.items()
+                                           if name in series and name not in stale})
+            self._version += 1
+            self._versions[device].append(self._version)
+            self._lengths[device].append(self._trimmed[device] + len(series["times"]))
+            self._trim(device)
+            self._changed.notify_all()
+            return self._version
+
+    def slope(self, device, channel, per=1.0, default=None):
+        """
+        :param per: Time unit of the result in seconds (60 for K/min).
+        :return: Current slope of a channel, or `default` while it is unknown.
+        """
+        with self._changed:
+            return self._trends[device].slope(channel, per, default)
+
+    def _trim(self, device):
+        series = self._series[device]
+        excess = len(series["times"]) - self.max_samples
+        if excess < TRIM_BLOCK:
+            return
+        # new lists, so views handed out earlier keep their samples
+        for name in series:
+            series[name] = series[name][excess:]
+        trimmed = self._trimmed[device] = self._trimmed[device] + excess
+        # versions whose samples are all gone: keep only the newest of them
+        i = bisect.bisect_right(self._lengths[device], trimmed)
+        if i > 1:
+            del self._versions[device][:i - 1]
+            del self._lengths[device][:i - 1]
+
+    def _length_at(self, device, version):
+        # total number of samples the device had once `version` was reached
+        i = bisect.bisect_right(self._versions[device], version)
+        return self._lengths[device][i - 1] if i else 0
+
+    def view(self, device):
+        """
+        :return: (version, {series name: SeriesView}) of the current data.
+        """
+        with self._changed:
+            series = self._series[device]
+            length = len(series["times"])
+            return self._version, {name: SeriesView(values, length)
+                                   for name, values in series.items()}
+
+    def since(self, version, devices=None):
+        """
+        Samples added after a given version.
+
+        :param version: Version the caller already has (0 for everything).
+        :param devices: Device names to include (default: all).
+        :return: (current version, {device: {series name: list of new values}}).
+                 Devices without new samples are left out.
+        """
+        with self._changed:
+            current = self._version
+            delta = {}
+            for dev in (devices if devices is not None else self._series):
+                start = max(0, self._length_at(dev, version) - self._trimmed[dev])
+                series = self._series[dev]
+                if len(series["times"]) > start:
+                    delta[dev] = {name: values[start:] for name, values in series.items()}
+            return current, delta
+
+    def wait(self, version, timeout=None):
+        """
+        Block until the store is newer than `version` or the timeout expires.
+
+        :return: The current version.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._version > version, timeout)
+            return self._version
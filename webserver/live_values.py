@@ -0,0 +1,132 @@
+import threading
+import time
+import numpy as np
+
+from ring_buffer import RingBufferSeries
+from trend import TREND_TIME
+
+# Samples of recent history kept per channel (one hour at one sample per second)
+LIVE_CAPACITY = 3600
+
+
+def _is_valid(value):
+    # None, NaN and non-numeric readings are not measurements
+    try:
+        return not np.isnan(float(value))
+    except (TypeError, ValueError):
+        return False
+
+
+class LiveValueStore:
+    """
+    Latest value and bounded recent history of every acquired channel.
+
+    The acquisition thread publishes one sample per cycle; any other thread
+    can read the newest value of a channel in O(1), or copy a recent window
+    of it, without touching the acquisition's own buffers. Values passed as
+    stale (a 372 channel held between scanner visits) stay the latest value,
+    but latest_time(channel) keeps the time the channel was last measured.
+    """
+
+    def __init__(self, capacity=LIVE_CAPACITY, trend_time=TREND_TIME):
+        """
+        :param capacity: Samples kept per channel; older ones are overwritten.
+        :param trend_time: Time constant of the slope estimates in seconds.
+        """
+        self._series = RingBufferSeries([], capacity, trend_time)
+        self._changed = threading.Condition(self._series.lock)
+        # channel -> time of its last valid, freshly measured value
+        self._fresh_time = {}
+
+    def publish(self, t, values, stale=()):
+        """
+        Store one sample of several channels and wake up waiting readers.
+
+        :param t: Sample time in seconds.
+        :param values: Dictionary {channel: value}.
+        :param stale: Channels not measured anew in this sample; their value
+                      stays current, but the trend skips them.
+        """
+        with self._changed:
+            self._series.append(t, values, stale)
+            for ch, value in values.items():
+                if ch not in stale and _is_valid(value):
+                    self._fresh_time[ch] = t
+            self._changed.notify_all()
+
+    def latest(self, channel, default=None):
+        """
+        :return: The newest value of a channel, or `default` if it has none yet.
+        """
+        value = self._series.latest(channel)
+        if value is None or np.isnan(value):
+            return default
+        return float(value)
+
+    def slope(self, channel, per=1.0, default=None):
+        """
+        Current trend of a channel from the streaming estimator, no history scan.
+
+        :param per: Time unit of the result in seconds (60 for K/min).
+        :return: Slope in value units per `per` seconds, or `default` while unknown.
+        """
+        return self._series.slope(channel, per, default)
+
+    def latest_time(self, channel=None):
+        """
+        :param channel: Channel name, or None for the store as a whole.
+        :return: Time at which the channel was last measured (its latest
+                 value may have been held since), or of the newest sample
+                 if no channel is given; None if there is none yet.
+        """
+        with self._changed:
+            if channel is not None:
+                return self._fresh_time.get(channel)
+            times = self._series.times()
+            return float(times[-1]) if len(times) else None
+
+    def recent(self, channel, seconds=None):
+        """
+        Copy of the recent history of a channel.
+
+        :param seconds: Window length (default: everything kept).
+        :return: (times, values) NumPy arrays, oldest first.
+        """
+        with self._changed:
+            times, columns = self._series.window(seconds)
+            if channel not in columns:
+                return np.array([]), np.array([])
+            return times.copy(), columns[channel].copy()
+
+    def wait_until(self, predicate, timeout=None, dwell=0.0):
+        """
+        Block until a condition on the live values holds.
+
+        The predicate is re-evaluated every time a sample is published, so
+        the caller wakes up on the first sample that satisfies it.
+
+        :param predicate: Callable without arguments returning True when the
+                          condition is met, e.g. lambda: store.latest('x') < 3.
+        :param timeout: Seconds to wait at most (default: no limit).
+        :param dwell: Seconds the condition must hold without interruption.
+        :return: True once the condition has held for `dwell`, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        held_since = None
+        with self._changed:
+            while True:
+                now = time.monotonic()
+                wake = None
+                if predicate():
+                    if held_since is None:
+                        held_since = now
+                    if now - held_since >= dwell:
+                        return True
+                    wake = held_since + dwell
+                else:
+                    held_since = None
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    wake = deadline if wake is None else min(wake, deadline)
+                self._changed.wait(None if wake is None else wake - now)
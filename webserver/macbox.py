@@ -1,6 +1,7 @@
 from controller_client import DeviceControllerClient
 from hardware_readout import HardwareTemperatureReader
 from SQL import SQL
+from broadcast import ReadingBroadcaster
 from device import connect_devices
 
 HOST = "0.0.0.0"
@@ -10,13 +11,16 @@ if __name__ == "__main__":
     # load devices and create controller
     devices = connect_devices()
     print("Detected devices:", list(devices.keys()))
-    controller = DeviceControllerClient(devices, HOST, PORT)
+
+    # live reading batches go from the readout thread to web subscribers
+    broadcaster = ReadingBroadcaster()
+    controller = DeviceControllerClient(devices, HOST, PORT, broadcaster)
 
     # create sql database instance
     sql = SQL(debug=False, options=["localhost", "axion_writer", 8082, "axion_db"])
 
     # create hardware reader
-    temp_reader = HardwareTemperatureReader(devices, sql)
+    temp_reader = HardwareTemperatureReader(devices, sql, broadcaster)
 
     # start controller thread
     controller.start()
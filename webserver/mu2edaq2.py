@@ -1,11 +1,12 @@
 from controller_server import DeviceControllerServer
-from remote_readout import plot_data, DBReader
+from remote_readout import plot_data, LiveReader, backfill
+from SQL import SQL
+from live_store import LiveDataStore
 from device import get_channels_for_device
 from flask import Flask, render_template, request, jsonify, Response
 
 import matplotlib.pyplot as plt
 import io
-import queue
 
 HOST = "127.0.0.1"
 PORT = 8084
@@ -152,12 +153,17 @@ for dev_name in devices.keys():
 
 print("Dynamic PLOT_MAPPING:", PLOT_MAPPING)
 
-# create sql database instance
-sql = SQL(debug=False, options=["localhost", "axion_writer", 8082, "axion_db"])
-
-plot_queue = queue.Queue()
-db_reader = DBReader(sql, plot_queue)
-db_reader.start()   # start reader thread
+# live readings are pushed from the macbox as they are read; the database
+# only keeps the history, of which the last hour is loaded once at startup
+plot_store = LiveDataStore(plot_data)
+try:
+    history_sql = SQL(debug=False, options=["localhost", "axion_writer", 8082, "axion_db"])
+    backfill(history_sql, plot_store)
+    history_sql.close()
+except Exception as e:
+    print("[DBReader] No history loaded:", e)
+live_reader = LiveReader(plot_store)
+live_subscription = controller.subscribe(live_reader.on_batch)
 
 @app.route("/plot/<int:plot_id>.png")
 def plot_png(plot_id):
@@ -167,23 +173,12 @@ def plot_png(plot_id):
 
     device, channels = PLOT_MAPPING[plot_id]
 
-    # Get latest DB data
-    latest_plot_data = None
-    try:
-        while True:
-            latest_plot_data = plot_queue.get_nowait()
-    except queue.Empty:
-        pass
-
-    if latest_plot_data is None:
-        latest_plot_data = plot_data
-
-    # Extract time + channel data for this device
-    device_data = latest_plot_data.get(device, {})
-    times = device_data.get("times", [])
+    # Read-only view of the live data for this device
+    _, device_data = plot_store.view(device)
+    times = device_data["times"].tolist()
 
     ys_dict = {
-        ch: device_data.get(ch, [])
+        ch: device_data[ch].tolist()
         for ch in channels
     }
 
@@ -214,8 +209,8 @@ def plot_png(plot_id):
             current_temp = ys[-1]
             idx = label_to_index[ch]
 
-            if len(times) > 11:
-                grad = (ys[-1] - ys[-10]) / (times[-1] - times[-10])
+            grad = plot_store.slope(device, ch, 60.0)
+            if grad is not None:
                 leg.texts[idx].set_text(
                     f"{ch}\n {current_temp:.3f}K\n {grad:2f}K/min"
                 )
@@ -233,26 +228,21 @@ def plot_png(plot_id):
 
 @app.route("/api/plotdata")
 def api_plotdata():
-
-    # Get latest DB data
-    latest_plot_data = None
-    try:
-        while True:
-            latest_plot_data = plot_queue.get_nowait()
-    except queue.Empty:
-        pass
-
-    if latest_plot_data is None:
-        latest_plot_data = plot_data
+    # ?since=<version> returns only the samples added after that version,
+    # together with the version to ask for next time
+    since = request.args.get("since", type=int)
+    version, delta = plot_store.since(since or 0)
 
     result = {}
     for pid, (dev_name, channels) in PLOT_MAPPING.items():
         result[pid] = {
-            ch: latest_plot_data.get(dev_name, {}).get(ch, [])
+            ch: delta.get(dev_name, {}).get(ch, [])
             for ch in channels
         }
 
-    return jsonify(result)
+    if since is None:
+        return jsonify(result)
+    return jsonify({"version": version, "plots": result})
 
 @app.route("/display/<device_name>")
 def display_device(device_name):
@@ -0,0 +1,138 @@
+import threading
+import time
+
+from trend import TrendEstimator
+
+# Fastest poll interval of each instrument in seconds. The LakeShore 224
+# returns every input from one KRDG? 0 query. On the LakeShore 372 the
+# control input (A) has its own converter, and the scanner withholds the
+# scanned channels itself while it settles after a channel change, so
+# neither needs a floor of its own here.
+LAKESHORE224_FASTEST = 0.5
+LAKESHORE372_FASTEST = 0.5
+
+# Poll interval bounds in seconds for each logical channel: (fastest, slowest).
+# Channels that move during a cycle may be polled quickly; plates that hardly
+# move drop to the slow end. Channels not listed use DEFAULT_BOUNDS.
+POLL_BOUNDS = {
+    "MC": (LAKESHORE372_FASTEST, 10.0),
+    "Still": (LAKESHORE372_FASTEST, 10.0),
+    "4HePotA": (LAKESHORE224_FASTEST, 10.0),
+    "3HePotA": (LAKESHORE224_FASTEST, 10.0),
+    "4HePotB": (LAKESHORE224_FASTEST, 10.0),
+    "3HePotB": (LAKESHORE224_FASTEST, 10.0),
+    "Condenser": (LAKESHORE224_FASTEST, 30.0),
+    "50K Plate": (LAKESHORE224_FASTEST, 60.0),
+    "4K Plate": (LAKESHORE224_FASTEST, 60.0),
+}
+DEFAULT_BOUNDS = (1.0, 20.0)
+
+# Relative rate of change (fraction of the value per minute) at which a
+# channel is polled twice as fast as its slowest interval.
+REFERENCE_RATE = 0.01
+
+
+class AdaptivePollScheduler:
+    """
+    Decide which logical channels are due for a reading.
+
+    Each channel gets a poll interval between its configured bounds that
+    shrinks as its recent relative rate of change |dT/dt| / T grows:
+
+        interval = slowest / (1 + rate / REFERENCE_RATE), clipped to the bounds
+
+    dT/dt and T come from a streaming TrendEstimator fed with every reading,
+    so a single noisy sample does not flip a channel to the fast rate.
+    """
+
+    def __init__(self, channels, bounds=None, reference_rate=REFERENCE_RATE):
+        """
+        :param channels: Iterable of logical channel names.
+        :param bounds: Dictionary {channel: (fastest, slowest)} overriding POLL_BOUNDS.
+        :param reference_rate: Relative rate (1/min) that halves the slowest interval.
+        """
+        all_bounds = dict(POLL_BOUNDS)
+        all_bounds.update(bounds or {})
+        self.reference_rate = reference_rate
+        self._lock = threading.Lock()
+        self._bounds = {ch: all_bounds.get(ch, DEFAULT_BOUNDS) for ch in channels}
+        self._trend = TrendEstimator(self._bounds)
+        self._interval = {ch: b[0] for ch, b in self._bounds.items()}
+        self._next_due = {ch: 0.0 for ch in self._bounds}  # all due at start
+
+    @property
+    def tick(self):
+        """Shortest poll interval of any channel, in seconds."""
+        return min(b[0] for b in self._bounds.values())
+
+    def due(self, now=None):
+        """
+        :return: Set of channels whose next reading is due.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {ch for ch, t in self._next_due.items() if t <= now}
+
+    def time_until_next(self, now=None):
+        """
+        :return: Seconds until the next channel is due (0 if one is due now).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return max(0.0, min(self._next_due.values()) - now)
+
+    def record(self, channel, value, now=None):
+        """
+        Record a fresh reading and reschedule the channel.
+
+        Channels that are not scheduled here are ignored, so callers can pass
+        every value a bulk read returned.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if channel not in self._bounds:
+                return
+            fastest, slowest = self._bounds[channel]
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                # No valid reading: retry at the fastest rate
+                self._next_due[channel] = now + fastest
+                return
+
+            self._trend.update(now, {channel: value})
+            slope = self._trend.slope(channel, 60.0)
+            level = self._trend.smoothed(channel)
+
+            if slope is not None and level:
+                rate = abs(slope) / abs(level)
+                interval = slowest / (1 + rate / self.reference_rate)
+                interval = min(max(interval, fastest), slowest)
+            else:
+                # Rate not known yet: sample quickly until it is
+                interval = fastest
+            self._interval[channel] = interval
+            self._next_due[channel] = now + interval
+
+    def record_readings(self, readings, requested=(), now=None):
+        """
+        Record every value of a {device: {channel: value}} readings dictionary.
+
+        Channels in `requested` that are missing from the readings (e.g. the
+        device did not answer) are retried at their fastest rate.
+        """
+        now = time.monotonic() if now is None else now
+        returned = set()
+        for sensors in readings.values():
+            for ch, value in sensors.items():
+                self.record(ch, value, now)
+                returned.add(ch)
+        for ch in set(requested) - returned:
+            self.record(ch, None, now)
+
+    def intervals(self):
+        """
+        :return: Dictionary {channel: current poll interval in seconds}.
+        """
+        with self._lock:
+            return dict(self._interval)
@@ -1,8 +1,7 @@
 import threading
 import time
-import copy
 import datetime
-import queue
+import numpy as np
 
 plot_data = {
     "CTC100A": {"times": [], "4switchA": [], "4pumpA": [], "3switchA": [], "3pumpA": []},
@@ -31,13 +30,22 @@ channel_names = [
     "Still [K]"
 ]
 
+# Seconds of history loaded from the database when the web front end starts
+BACKFILL_SECONDS = 3600
+
 class DBReader(threading.Thread):
-    def __init__(self, sql, plot_queue, channel_names, interval=2.0):
+    '''
+    Reads samples from the database into the plot store. mu2edaq2 uses one
+    poll() at startup to load recent history before the live stream takes
+    over (see backfill); run() keeps polling, for setups without a stream.
+    '''
+    def __init__(self, sql, store, channel_names, interval=2.0, since=None):
         super().__init__(daemon=True)
 
         self.sql = sql
         self.channel_names = channel_names
-        self.plot_queue = plot_queue
+        # LiveDataStore shared with the web request threads
+        self.store = store
         self.interval = interval
 
         # strip " [K]" suffix
@@ -52,58 +60,121 @@ class DBReader(threading.Thread):
         }
 
         # SCID lookup for full names
-        self.scids = {name: sql.getSCID(name) for name in channel_names}
-
-        last = sql.lastUpdate()
-        self.last_timestamp = last if last else 0
-
-        # working internal state (deepcopy)
-        self.state = copy.deepcopy(plot_data)
+        self.scids = sql.getSCIDs(channel_names, register=False)
+
+        # rows after this time are read; default: only rows written from now on
+        if since is None:
+            last = sql.lastUpdate()
+            since = last if last else 0
+        self.last_timestamp = since
+
+    def poll(self):
+        '''
+        Append every sample newer than the last one seen, fetched in one
+        query, so each poll costs the number of new samples, not history.
+        Returns True if anything was added.
+        '''
+        scids = list(self.scids.values())
+        times, values = self.sql.getSCValues(scids, self.last_timestamp, after=True)
+        if len(times) == 0:
+            return False
+
+        columns = {}
+        for i, full_name in enumerate(self.channel_names):
+            clean = self.clean_names[full_name]
+            dev = self.device_map.get(clean)
+            if dev:
+                columns.setdefault(dev, []).append((clean, values[:, i]))
+
+        for dev, chans in columns.items():
+            # a device gets the times at which any of its channels has a sample
+            has_sample = np.zeros(len(times), dtype=bool)
+            for _, column in chans:
+                has_sample |= ~np.isnan(column)
+            if not has_sample.any():
+                continue
+            # DB times are datetimes; the live stream uses unix seconds
+            self.store.append(dev, [_unix_time(t) for t in times[has_sample].tolist()],
+                              {clean: column[has_sample].tolist() for clean, column in chans})
+
+        # high-water mark: rows up to here have been seen
+        self.last_timestamp = times[-1:].tolist()[0]
+        return True
 
     def run(self):
         print("[DBReader] Starting DB poll thread.")
 
         while True:
             try:
-                timestamps = self.sql.getSCTimes(self.last_timestamp)
-
-                for ts in sorted(timestamps):
-                    rows = self.sql.getSCValues(list(self.scids.values()), ts)
-                    if not rows:
-                        continue
-
-                    record = rows[0]
-                    t = record["time"]
-
-                    updated_devices = set()
+                self.poll()
+            except Exception as e:
+                print("[DBReader] ERROR:", e)
 
-                    for i, full_name in enumerate(self.channel_names):
+            time.sleep(self.interval)
 
-                        clean = self.clean_names[full_name]
-                        dev = self.device_map.get(clean)
-                        if not dev:
-                            continue
 
-                        raw = record[f"value-{i+1}"]
+def _unix_time(t):
+    return t.timestamp() if hasattr(t, "timestamp") else float(t)
 
-                        try:
-                            val = float(raw)
-                        except:
-                            continue
 
-                        self.state[dev][clean].append(val)
-                        updated_devices.add(dev)
+def backfill(sql, store, seconds=BACKFILL_SECONDS):
+    '''
+    Load the last `seconds` of history from the database into the store.
+    Returns True if anything was added.
+    '''
+    since = datetime.datetime.now() - datetime.timedelta(seconds=seconds)
+    return DBReader(sql, store, channel_names, since=since).poll()
 
-                    for dev in updated_devices:
-                        self.state[dev]["times"].append(t)
 
-                    # push snapshot
-                    self.plot_queue.put(copy.deepcopy(self.state))
+# readout channel name -> plot_data channel name, where they differ
+LIVE_ALIASES = {
+    "50K Plate": "50K",
+    "4K Plate": "4K",
+}
 
-                    self.last_timestamp = t
+class LiveReader:
+    '''
+    Builds plot data from the live reading stream of the macbox controller
+    instead of polling the database. Pass `on_batch` as the callback of
+    DeviceControllerServer.subscribe().
+    '''
+    def __init__(self, store):
+        # LiveDataStore shared with the web request threads
+        self.store = store
+        # last good value of each channel
+        self.last = {}
 
-            except Exception as e:
-                print("[DBReader] ERROR:", e)
-
-            time.sleep(self.interval)
+        # maps clean channel name → device
+        self.device_map = {
+            ch: dev
+            for dev, chans in plot_data.items()
+            for ch in chans.keys()
+            if ch != "times"
+        }
 
+    def on_batch(self, batch):
+        t = batch["time"]
+
+        values = {}
+        for sensors in batch["readings"].values():
+            for name, raw in sensors.items():
+                clean = LIVE_ALIASES.get(name, name)
+                if clean not in self.device_map:
+                    continue
+                try:
+                    values[clean] = float(raw)
+                except (TypeError, ValueError):
+                    continue
+
+        updated_devices = {self.device_map[ch] for ch in values}
+
+        self.last.update(values)
+
+        # keep every channel of an updated device aligned with its times,
+        # holding the last value for channels not read in this batch
+        for dev in updated_devices:
+            channels = [ch for ch in plot_data[dev] if ch != "times"]
+            self.store.append(dev, [t], {
+                ch: [self.last.get(ch, float("nan"))]
+                for ch in channels
+            }, stale={ch for ch in channels if ch not in values})
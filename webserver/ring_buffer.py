@@ -0,0 +1,138 @@
+import threading
+import numpy as np
+
+from trend import TrendEstimator, TREND_TIME
+
+
+class RingBufferSeries:
+    """
+    Fixed-capacity time series for a group of channels.
+
+    Times and values live in preallocated float64 arrays. Every sample is
+    written twice, at i and i + capacity, so the newest `capacity` samples
+    are always one contiguous slice and can be handed out as NumPy views
+    without copying. Appending is O(1) and a time window is found by binary
+    search, so neither gets slower as the buffer fills. Each sample also
+    updates a TrendEstimator, so the current slope of every channel is
+    available without looking back through the buffer.
+    """
+
+    def __init__(self, channels, capacity=4096, trend_time=TREND_TIME):
+        """
+        :param channels: Iterable of channel names.
+        :param capacity: Number of samples kept; older ones are overwritten.
+        :param trend_time: Time constant of the slope estimates in seconds.
+        """
+        self.capacity = int(capacity)
+        self._times = np.full(2 * self.capacity, np.nan)
+        self._values = {}
+        self._next = 0      # position of the next write in [0, capacity)
+        self._count = 0     # samples stored, at most capacity
+        self.trend = TrendEstimator((), trend_time)
+        self.lock = threading.RLock()
+        for ch in channels:
+            self.add_channel(ch)
+
+    @property
+    def channels(self):
+        return list(self._values)
+
+    def add_channel(self, channel):
+        """
+        Add a channel; it reads NaN for samples taken before it existed.
+        """
+        with self.lock:
+            if channel not in self._values:
+                self._values[channel] = np.full(2 * self.capacity, np.nan)
+                self.trend.add_channel(channel)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, t, values, stale=()):
+        """
+        Append one sample.
+
+        :param t: Sample time; must not be earlier than the previous sample.
+        :param values: Dictionary {channel: value}. Unknown channels are
+                       added; channels not given are stored as NaN.
+        :param stale: Channels whose value is a repeat of an earlier reading
+                      (e.g. held between scanner visits). They are stored,
+                      but not fed to the trend, which would see a staircase.
+        """
+        with self.lock:
+            i, j = self._next, self._next + self.capacity
+            self._times[i] = self._times[j] = t
+            for ch in values:
+                self.add_channel(ch)
+            row = []
+            for ch, column in self._values.items():
+                value = values.get(ch)
+                try:
+                    value = np.nan if value is None else float(value)
+                except (TypeError, ValueError):
+                    value = np.nan
+                column[i] = column[j] = value
+                row.append(np.nan if ch in stale else value)
+            # channels are added to the trend in the same order as to _values
+            self.trend.update(t, row)
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _span(self):
+        # contiguous slice holding the stored samples, oldest first
+        end = self._next + self.capacity if self._count == self.capacity else self._next
+        return slice(end - self._count, end)
+
+    def times(self):
+        """
+        :return: View of all stored sample times, oldest first.
+        """
+        with self.lock:
+            return self._times[self._span()]
+
+    def column(self, channel):
+        """
+        :return: View of all stored values of a channel, oldest first.
+        """
+        with self.lock:
+            return self._values[channel][self._span()]
+
+    def latest(self, channel, default=None):
+        """
+        :return: The newest value of a channel (NaN if it was not read), or
+                 `default` if nothing is stored yet.
+        """
+        with self.lock:
+            if not self._count or channel not in self._values:
+                return default
+            return self._values[channel][self._next - 1 + self.capacity]
+
+    def slope(self, channel, per=1.0, default=None):
+        """
+        :param per: Time unit of the result in seconds (60 for K/min).
+        :return: Current slope of a channel, or `default` while it is unknown.
+        """
+        with self.lock:
+            return self.trend.slope(channel, per, default)
+
+    def window(self, seconds, now=None):
+        """
+        Samples from the last `seconds` seconds.
+
+        :param seconds: Window length; None for everything stored.
+        :param now: End of the window (default: time of the newest sample).
+        :return: (times, {channel: values}) as NumPy views into the buffer.
+                 Copy them before releasing `lock` if they must not change
+                 under a concurrent append.
+        """
+        with self.lock:
+            span = self._span()
+            times = self._times[span]
+            start = 0
+            if seconds is not None and len(times):
+                end_time = times[-1] if now is None else now
+                start = int(np.searchsorted(times, end_time - seconds, side="left"))
+            window = slice(span.start + start, span.stop)
+            return (self._times[window],
+                    {ch: column[window] for ch, column in self._values.items()})
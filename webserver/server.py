@@ -21,8 +21,9 @@ from lakeshore224device import LakeShore224Device
 from lakeshore372device import LakeShore372Device
 import serial
 
-from hardware_reader import HardwareTemperatureReader
-from controller import hardware_lock
+from hardware_reader import HardwareTemperatureReader, DEVICE_CHANNELS
+from poll_scheduler import AdaptivePollScheduler
+from ring_buffer import RingBufferSeries
 from controller import DeviceController
 from device import connect_devices
 
@@ -203,15 +204,16 @@ def api_still_off():
 # ---------------------------------------------------------------------
 
 # new structure:
-# plot_data[device][channel] = list of values
-# plot_data[device]["times"] = list of timestamps
+# plot_data[device] = RingBufferSeries holding the times and every channel
 
+# seconds of history shown in the live plots
+WINDOW_SECONDS = 300
 
 plot_data = {
-    "CTC100A": {"times": [], "4switchA": [], "4pumpA": [], "3switchA": [], "3pumpA": []},
-    "CTC100B": {"times": [], "4switchB": [], "4pumpB": [], "3switchB": [], "3pumpB": []},
-    "Lakeshore372": {"times": [], "MC": [], "Still": []},
-    "Lakeshore224": {"times": [], "4HePotA": [], "3HePotA": [], "4HePotB": [], "3HePotB": [], "Condenser": [], "50K": [], "4K": []}
+    "CTC100A": RingBufferSeries(["4switchA", "4pumpA", "3switchA", "3pumpA"]),
+    "CTC100B": RingBufferSeries(["4switchB", "4pumpB", "3switchB", "3pumpB"]),
+    "Lakeshore372": RingBufferSeries(["MC", "Still"]),
+    "Lakeshore224": RingBufferSeries(["4HePotA", "3HePotA", "4HePotB", "3HePotB", "Condenser", "50K", "4K"])
 }
 # -------------------------
 # Dynamic plot mapping
@@ -220,8 +222,8 @@ PLOT_MAPPING = {}
 plot_id = 1
 
 for dev_name in temp_reader.devices.keys():
-    # use channels from plot_data (ignore 'times')
-    channels = [k for k in plot_data.get(dev_name, {}) if k != "times"]
+    # use channels from plot_data
+    channels = plot_data[dev_name].channels if dev_name in plot_data else []
     if channels:
         PLOT_MAPPING[plot_id] = (dev_name, channels)
         plot_id += 1
@@ -231,12 +233,22 @@ print("Dynamic PLOT_MAPPING:", PLOT_MAPPING)
 
 plot_lock = threading.Lock()
 
+# each channel is polled at a rate set by how fast it is changing
+poll_scheduler = AdaptivePollScheduler(
+    ch for dev_name in devices for ch in DEVICE_CHANNELS.get(dev_name, []))
+
 def background_update_thread():
     start_time = time.time()
 
     while True:
-        with hardware_lock:
-            temps = temp_reader.read_temperatures()
+        due = poll_scheduler.due()
+        if not due:
+            time.sleep(poll_scheduler.time_until_next())
+            continue
+
+        # devices are read in parallel, each on its own I/O worker
+        temps = temp_reader.read_temperatures(due)
+        poll_scheduler.record_readings(temps, due)
 
         t = time.time() - start_time
 
@@ -245,27 +257,14 @@ def background_update_thread():
 
                 # Ensure structure exists
                 if dev_name not in plot_data:
-                    plot_data[dev_name] = {"times": []}
-                if "times" not in plot_data[dev_name]:
-                    plot_data[dev_name]["times"] = []
-
-                plot_data[dev_name]["times"].append(t)
-
-                for ch, value in sensors.items():
-                    if ch not in plot_data[dev_name]:
-                        plot_data[dev_name][ch] = []
-                    plot_data[dev_name][ch].append(value)
-
-                # window = 300 seconds
-                window = 300
-                times = plot_data[dev_name]["times"]
-                start = next((i for i,x in enumerate(times) if x >= t - window), 0)
-
-                # trim to last 300 seconds
-                for ch in plot_data[dev_name]:
-                    plot_data[dev_name][ch] = plot_data[dev_name][ch][start:]
+                    plot_data[dev_name] = RingBufferSeries(sensors)
+                series = plot_data[dev_name]
 
-        time.sleep(2)
+                # channels of this device that were not read this time keep
+                # their last reading; the oldest samples are overwritten
+                values = {ch: series.latest(ch) for ch in series.channels}
+                values.update(sensors)
+                series.append(t, values, stale=set(series.channels) - set(sensors))
 
 threading.Thread(target=background_update_thread, daemon=True).start()
 
@@ -309,8 +308,11 @@ def plot_png(plot_id):
     device, channels = PLOT_MAPPING[plot_id]
 
     with plot_lock:
-        times = plot_data.get(device, {}).get("times", [])
-        ys_dict = {ch: plot_data[device].get(ch, []) for ch in channels}
+        # copies, so the arrays cannot change while the figure is drawn
+        times, columns = plot_data[device].window(WINDOW_SECONDS)
+        times = times.copy()
+        ys_dict = {ch: columns[ch].copy() for ch in channels}
+        slopes = {ch: plot_data[device].slope(ch, 60.0) for ch in channels}
 
     buf = io.BytesIO()
     fig, ax = plt.subplots(figsize=(6, 3))
@@ -321,7 +323,7 @@ def plot_png(plot_id):
     ax.set_title(f"{device}")
 
     for ch, ys in ys_dict.items():
-        if times and ys:
+        if len(times) and len(ys):
             ax.plot(times, ys, label=ch)
 
     leg = ax.legend(
@@ -333,11 +335,11 @@ def plot_png(plot_id):
     label_to_index = {t.get_text(): i for i, t in enumerate(leg.texts)}
 
     for ch, ys in ys_dict.items():
-        if times and ys:
+        if len(times) and len(ys):
             current_temp = ys[-1]
             idx = label_to_index[ch]
-            if len(times)>11:
-                grad = (ys[-1] - ys[-10]) / (times[-1] - times[-10])
+            grad = slopes[ch]
+            if grad is not None:
                 leg.texts[idx].set_text(
                 f"{ch}\n {current_temp:.3f}K\n {grad:2f}K/min"
                 )
@@ -362,7 +364,8 @@ def api_plotdata():
     with plot_lock:
         result = {}
         for pid, (dev_name, channels) in PLOT_MAPPING.items():
-            result[pid] = {ch: plot_data.get(dev_name, {}).get(ch, []) for ch in channels}
+            _, columns = plot_data[dev_name].window(WINDOW_SECONDS)
+            result[pid] = {ch: columns[ch].tolist() for ch in channels}
         return jsonify(result)
 
 # -------------------------